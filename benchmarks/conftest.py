@@ -0,0 +1,139 @@
+"""Fixtures for the synchronizer benchmarks.
+
+The benchmarks run with pytest-benchmark::
+
+    python -m pytest benchmarks
+
+By default, each benchmark runs with 100, 1k, 10k and 100k kernels; use
+``--kernel-counts=100,1000`` to run a subset.
+"""
+from __future__ import annotations
+
+import itertools
+import json
+import os
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+import pytest
+from jupyter_server.services.contents.manager import ContentsManager
+from jupyter_server.services.kernels.kernelmanager import MappingKernelManager
+from tornado.httpserver import HTTPServer
+from tornado.testing import bind_unused_port
+from tornado.web import Application, RequestHandler
+
+from jupyter_server_synchronizer import SynchronizerSessionManager
+from jupyter_server_synchronizer.kernel_records import KernelRecord
+
+os.environ["JUPYTER_PLATFORM_DIRS"] = "1"
+pytest_plugins = ["pytest_jupyter.jupyter_server"]
+
+KERNEL_COUNTS = "100,1000,10000,100000"
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--kernel-counts",
+        default=KERNEL_COUNTS,
+        help=f"Comma separated numbers of kernels to benchmark with (default: {KERNEL_COUNTS}).",
+    )
+
+
+def pytest_generate_tests(metafunc):
+    if "kernel_count" in metafunc.fixturenames:
+        counts = [int(n) for n in metafunc.config.getoption("kernel_counts").split(",")]
+        metafunc.parametrize("kernel_count", counts)
+
+
+def kernel_ids(n, prefix="kernel"):
+    return [f"{prefix}-{i}" for i in range(n)]
+
+
+def make_records(n, prefix="kernel", **fields):
+    return [
+        KernelRecord(kernel_id=kernel_id, kernel_name="python3", **fields)
+        for kernel_id in kernel_ids(n, prefix)
+    ]
+
+
+@pytest.fixture(params=["memory", "file"])
+def database_filepath(request, tmp_path):
+    """Returns a function that gives a new, empty database on each call."""
+    if request.param == "memory":
+        return lambda: ":memory:"
+    counter = itertools.count()
+    return lambda: str(tmp_path / f"jupyter-session-{next(counter)}.db")
+
+
+@pytest.fixture()
+def run(jp_environ, jp_asyncio_loop):
+    """Run a coroutine to completion on the test's event loop."""
+    return jp_asyncio_loop.run_until_complete
+
+
+class GatewayKernelsHandler(RequestHandler):
+    def initialize(self, gateway):
+        self.gateway = gateway
+
+    def get(self):
+        self.write(self.gateway.body)
+
+
+class StubGateway:
+    """Serves a kernel list like a Kernel/Enterprise Gateway's `/api/kernels`."""
+
+    def __init__(self):
+        self.kernels_url = None
+        self.set_kernels([])
+
+    def set_kernels(self, ids):
+        kernels = [{"id": kernel_id, "name": "python3"} for kernel_id in ids]
+        self.body = json.dumps(kernels).encode()
+
+
+@pytest.fixture()
+def stub_gateway(jp_asyncio_loop):
+    gateway = StubGateway()
+    sock, port = bind_unused_port()
+    server = HTTPServer(
+        Application([("/api/kernels", GatewayKernelsHandler, {"gateway": gateway})])
+    )
+    server.add_sockets([sock])
+    gateway.kernels_url = f"http://127.0.0.1:{port}/api/kernels"
+    yield gateway
+    server.stop()
+
+
+def make_ready_kernel(kernel_id, kernel_name):
+    ready: Future[None] = Future()
+    ready.set_result(None)
+    return SimpleNamespace(kernel_id=kernel_id, kernel_name=kernel_name, ready=ready)
+
+
+@pytest.fixture()
+def make_synchronizer(stub_gateway):
+    """Returns a function that creates a synchronizer polling the stub
+    gateway, whose kernel manager only pretends to start kernels.
+    """
+    synchronizers = []
+
+    def make(database_filepath):
+        kernel_manager = MappingKernelManager()
+        kernel_manager.kernels_url = stub_gateway.kernels_url
+
+        async def start_kernel(kernel_id=None, kernel_name=None, **kwargs):
+            kernel_manager._kernels[kernel_id] = make_ready_kernel(kernel_id, kernel_name)
+            return kernel_id
+
+        kernel_manager.start_kernel = start_kernel
+        synchronizer = SynchronizerSessionManager(
+            kernel_manager=kernel_manager,
+            contents_manager=ContentsManager(),
+            database_filepath=database_filepath,
+        )
+        synchronizers.append(synchronizer)
+        return synchronizer
+
+    yield make
+    for synchronizer in synchronizers:
+        synchronizer.close()
@@ -0,0 +1,44 @@
+"""Benchmarks for polling a gateway's kernel list."""
+from __future__ import annotations
+
+import time
+from types import SimpleNamespace
+
+import pytest
+from conftest import kernel_ids
+
+from jupyter_server_synchronizer.gateway import GatewayKernelPoller
+from jupyter_server_synchronizer.http_client import KeepAliveHTTPClient
+from jupyter_server_synchronizer.kernel_records import KernelRecord
+
+
+@pytest.mark.parametrize("keep_alive", [False, True], ids=["shared", "keep-alive"])
+def test_poll_gateway(benchmark, run, kernel_count, stub_gateway, keep_alive):
+    """Polls of an unchanged kernel list, through Jupyter Server's shared
+    Gateway client or a keep-alive client. The stub gateway (a Tornado
+    handler) sets an ETag, so after the first poll it answers
+    `304 Not Modified`: this measures the overhead of each request. The
+    CPU time per poll (of both the client and the stub gateway, which
+    run in the same process) is stored in the benchmark's `extra_info`.
+    """
+    stub_gateway.set_kernels(kernel_ids(kernel_count))
+    client = KeepAliveHTTPClient() if keep_alive else None
+    poller = GatewayKernelPoller(url=stub_gateway.kernels_url, client=client)
+    # Always poll, however long the response takes.
+    poller.slow_response = float("inf")
+    synchronizer = SimpleNamespace(kernel_record_class=KernelRecord)
+    records = run(poller.poll(synchronizer))
+    cpu_times = []
+
+    def poll():
+        start = time.process_time()
+        records = run(poller.poll(synchronizer))
+        cpu_times.append(time.process_time() - start)
+        return records
+
+    assert benchmark(poll) is records
+    assert len(records) == kernel_count
+    benchmark.extra_info["cpu_seconds_per_poll"] = sum(cpu_times) / len(cpu_times)
+    if client is not None:
+        assert client.connections_opened == 1
+        client.close()
@@ -0,0 +1,37 @@
+"""Benchmarks for merging kernel records."""
+from __future__ import annotations
+
+from conftest import make_records
+
+from jupyter_server_synchronizer.kernel_records import KernelRecord, KernelRecordList
+
+
+def test_build_record_list(benchmark, kernel_count):
+    records = make_records(kernel_count, alive=True)
+    record_list = benchmark(KernelRecordList, *records)
+    assert len(record_list) == kernel_count
+
+
+def test_merge_records(benchmark, kernel_count):
+    records = make_records(kernel_count, alive=True)
+    updates = [KernelRecord(kernel_id=r.kernel_id, recorded=True) for r in records]
+
+    def setup():
+        return (KernelRecordList(*(r.copy() for r in records)),), {}
+
+    def merge(record_list):
+        for record in updates:
+            record_list.update(record)
+
+    benchmark.pedantic(merge, setup=setup, rounds=5)
+
+
+def test_diff_record_lists(benchmark, kernel_count):
+    # A tenth of the kernels stopped, and as many started.
+    churn = kernel_count // 10
+    records = make_records(kernel_count, alive=True)
+    previous = KernelRecordList(*records)
+    current = KernelRecordList(*records[churn:], *make_records(churn, "new", alive=True))
+
+    delta = benchmark(current.diff, previous)
+    assert len(delta.added) == len(delta.removed) == churn
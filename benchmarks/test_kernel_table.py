@@ -0,0 +1,65 @@
+"""Benchmarks for the kernel database."""
+from __future__ import annotations
+
+from conftest import make_records
+
+from jupyter_server_synchronizer.kernel_db import KernelTable
+from jupyter_server_synchronizer.kernel_records import KernelRecord
+
+
+def make_table(database_filepath, records=()):
+    table = KernelTable(database_filepath=database_filepath)
+    table.save_many(records)
+    return table
+
+
+def test_save_many(benchmark, kernel_count, database_filepath):
+    records = make_records(kernel_count)
+
+    def setup():
+        return (make_table(database_filepath()),), {}
+
+    benchmark.pedantic(lambda table: table.save_many(records), setup=setup, rounds=5)
+
+
+def test_update_many(benchmark, kernel_count, database_filepath):
+    table = make_table(database_filepath(), make_records(kernel_count))
+    updates = [
+        KernelRecord(kernel_id=r.kernel_id, kernel_name="python2")
+        for r in make_records(kernel_count)
+    ]
+    benchmark(table.update_many, updates)
+
+
+def test_upsert_many(benchmark, kernel_count, database_filepath):
+    table = make_table(database_filepath(), make_records(kernel_count // 2))
+    # Half of the records exist, half are new.
+    records = make_records(kernel_count)
+    benchmark(table.upsert_many, records)
+
+
+def test_list(benchmark, kernel_count, database_filepath):
+    table = make_table(database_filepath(), make_records(kernel_count))
+    records = benchmark(table.list)
+    assert len(records) == kernel_count
+
+
+def test_delete_many(benchmark, kernel_count, database_filepath):
+    records = make_records(kernel_count)
+
+    def setup():
+        return (make_table(database_filepath(), records),), {}
+
+    benchmark.pedantic(lambda table: table.delete_many(records), setup=setup, rounds=5)
+
+
+def test_changes_since(benchmark, kernel_count, database_filepath):
+    """Read the rows changed since a version, after a tenth of them changed."""
+    table = make_table(database_filepath(), make_records(kernel_count))
+    version = table.change_version
+    table.update_many(
+        KernelRecord(kernel_id=r.kernel_id, kernel_name="python2")
+        for r in make_records(kernel_count // 10)
+    )
+    changes = benchmark(table.changes_since, version)
+    assert len(changes.records) == kernel_count // 10
@@ -0,0 +1,78 @@
+"""Benchmarks for full synchronizations, against a stub gateway."""
+from __future__ import annotations
+
+from conftest import kernel_ids, make_ready_kernel
+
+
+def add_sessions(synchronizer, ids):
+    synchronizer.cursor.executemany(
+        "INSERT INTO session VALUES (?,?,?,?,?)",
+        ((f"session-{k}", f"path-{k}", f"name-{k}", "notebook", k) for k in ids),
+    )
+
+
+def test_sync_managers_cold(
+    benchmark, run, kernel_count, database_filepath, stub_gateway, make_synchronizer
+):
+    """A restarted server: all gateway kernels are hydrated and recorded."""
+    ids = kernel_ids(kernel_count)
+    stub_gateway.set_kernels(ids)
+
+    def setup():
+        synchronizer = make_synchronizer(database_filepath())
+        add_sessions(synchronizer, ids)
+        return (synchronizer,), {}
+
+    def sync(synchronizer):
+        run(synchronizer.sync_managers())
+        assert len(synchronizer.kernel_manager._kernels) == kernel_count
+
+    benchmark.pedantic(sync, setup=setup, rounds=3)
+
+
+def test_sync_managers_steady(
+    benchmark, run, kernel_count, database_filepath, stub_gateway, make_synchronizer
+):
+    """A regular sync in which nothing changed."""
+    ids = kernel_ids(kernel_count)
+    stub_gateway.set_kernels(ids)
+    synchronizer = make_synchronizer(database_filepath())
+    add_sessions(synchronizer, ids)
+    run(synchronizer.sync_managers())
+
+    benchmark(lambda: run(synchronizer.sync_managers()))
+
+
+def test_sync_managers_churn(
+    benchmark, run, kernel_count, database_filepath, stub_gateway, make_synchronizer
+):
+    """A regular sync in which a tenth of the kernels stopped and as many started."""
+    churn = kernel_count // 10
+    ids = kernel_ids(kernel_count)
+    new_ids = kernel_ids(churn, "new")
+
+    def setup():
+        stub_gateway.set_kernels(ids)
+        synchronizer = make_synchronizer(database_filepath())
+        add_sessions(synchronizer, ids + new_ids)
+        run(synchronizer.sync_managers())
+        stub_gateway.set_kernels(ids[churn:] + new_ids)
+        return (synchronizer,), {}
+
+    benchmark.pedantic(lambda s: run(s.sync_managers()), setup=setup, rounds=3)
+
+
+def test_delete_stale_sessions(benchmark, run, kernel_count, database_filepath, make_synchronizer):
+    """Half of the sessions belong to kernels the kernel manager does not know."""
+    ids = kernel_ids(kernel_count)
+
+    def setup():
+        synchronizer = make_synchronizer(database_filepath())
+        for kernel_id in ids[::2]:
+            synchronizer.kernel_manager._kernels[kernel_id] = make_ready_kernel(
+                kernel_id, "python3"
+            )
+        add_sessions(synchronizer, ids)
+        return (synchronizer,), {}
+
+    benchmark.pedantic(lambda s: run(s.delete_stale_sessions()), setup=setup, rounds=3)
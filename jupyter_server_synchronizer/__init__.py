@@ -1,4 +1,24 @@
+from __future__ import annotations
+
+import typing as t
+
 from ._version import __version__
 from .manager import SynchronizerSessionManager
 
 __all__ = ["__version__", "SynchronizerSessionManager"]
+
+
+def _jupyter_server_extension_points() -> list[dict[str, str]]:
+    return [{"module": "jupyter_server_synchronizer"}]
+
+
+def _load_jupyter_server_extension(serverapp: t.Any) -> None:
+    """Register the synchronizer's API handlers."""
+    from jupyter_server.utils import url_path_join
+
+    from .handlers import default_handlers
+
+    base_url = serverapp.web_app.settings["base_url"]
+    serverapp.web_app.add_handlers(
+        ".*$", [(url_path_join(base_url, path), handler) for path, handler in default_handlers]
+    )
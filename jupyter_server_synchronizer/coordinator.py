@@ -0,0 +1,107 @@
+"""Coordinate synchronization runs."""
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+
+class SyncCoordinator:
+    """Runs at most one synchronization at a time.
+
+    Callers that arrive while a sync is running either join it, or
+    share a single follow-up sync that starts once it finishes. The
+    follow-up sees every change made before it was requested.
+    """
+
+    def __init__(
+        self, sync: Callable[[], Awaitable[None]], log: logging.Logger | None = None
+    ) -> None:
+        """Initialize the coordinator."""
+        self._sync = sync
+        self.log = log or logging.getLogger(__name__)
+        self._current: asyncio.Future[None] | None = None
+        self._next: asyncio.Future[None] | None = None
+        # Requests served by the current and the queued sync.
+        self._current_requests = 0
+        self._next_requests = 0
+        # The callers' futures still waiting for each sync.
+        self._waiters: dict[asyncio.Future[None], set[asyncio.Future[None]]] = {}
+        #: Number of syncs started.
+        self.runs = 0
+        #: Number of requests that shared a sync started by another request.
+        self.coalesced = 0
+
+    @property
+    def running(self) -> bool:
+        """Whether a sync is in flight."""
+        return self._current is not None and not self._current.done()
+
+    def request(self, fresh: bool = True) -> asyncio.Future[None]:
+        """Request a sync and return a future for its completion.
+
+        If no sync is running, one is started. Otherwise, the request
+        joins the queued follow-up sync (queueing one if needed), or
+        the running sync if `fresh` is False.
+
+        Each caller gets its own future: the sync is only cancelled
+        once every caller waiting for it has cancelled theirs.
+        """
+        current = self._current
+        if current is not None and not current.done() and not fresh:
+            self._current_requests += 1
+            self.coalesced += 1
+            return self._share(current)
+        if self._next is not None and not self._next.done():
+            self._next_requests += 1
+            self.coalesced += 1
+            return self._share(self._next)
+        if current is None or current.done():
+            self._current_requests = 1
+            self._current = self._start(self._run())
+            return self._share(self._current)
+        self._next_requests = 1
+        self._next = self._start(self._run_after(current))
+        return self._share(self._next)
+
+    def _start(self, coro: Awaitable[None]) -> asyncio.Future[None]:
+        future = asyncio.ensure_future(coro)
+        future.add_done_callback(self._retrieve_exception)
+        future.add_done_callback(lambda f: self._waiters.pop(f, None))
+        return future
+
+    def _retrieve_exception(self, future: asyncio.Future[None]) -> None:
+        # Log failures here, so that syncs nobody awaits are not lost.
+        if not future.cancelled() and future.exception() is not None:
+            self.log.error("Synchronizer failed: %s", future.exception())
+
+    def _share(self, sync: asyncio.Future[None]) -> asyncio.Future[None]:
+        shared = asyncio.shield(sync)
+        waiters = self._waiters.setdefault(sync, set())
+        waiters.add(shared)
+
+        def on_done(shared: asyncio.Future[None]) -> None:
+            waiters.discard(shared)
+            if shared.cancelled() and not waiters and not sync.done():
+                sync.cancel()
+            if not shared.cancelled():
+                # The failure is logged once, for the sync itself.
+                shared.exception()
+
+        shared.add_done_callback(on_done)
+        return shared
+
+    async def _run(self) -> None:
+        self.runs += 1
+        try:
+            await self._sync()
+        finally:
+            if self._current_requests > 1:
+                self.log.debug("Sync served %d coalesced requests.", self._current_requests)
+
+    async def _run_after(self, previous: asyncio.Future[None]) -> None:
+        # The previous sync's callers handle its result.
+        await asyncio.wait([previous])
+        self._current, self._next = self._next, None
+        self._current_requests, self._next_requests = self._next_requests, 0
+        await self._run()
@@ -1,23 +1,390 @@
 """Gateway utils."""
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+import asyncio
+import codecs
+import hashlib
+import json
+import operator
+import re
+import time
+import weakref
+from typing import TYPE_CHECKING, Any
 
-from jupyter_server.gateway.gateway_client import gateway_request
-from tornado.escape import json_decode
+from jupyter_server.gateway.gateway_client import GatewayClient, gateway_request
+from jupyter_server.utils import url_path_join
+from tornado import web
+from tornado.httpclient import HTTPClientError
+from tornado.iostream import StreamClosedError
+
+from .http_client import KeepAliveHTTPClient
+from .metrics import SYNC_ERRORS_TOTAL
 
 if TYPE_CHECKING:
     from jupyter_server_synchronizer import SynchronizerSessionManager
+    from jupyter_server_synchronizer.kernel_records import KernelRecord
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+# The Gateway client's connection arguments that a KeepAliveHTTPClient accepts.
+_CLIENT_ARGS = (
+    "headers",
+    "auth_username",
+    "auth_password",
+    "validate_cert",
+    "ca_certs",
+    "client_cert",
+    "client_key",
+)
+
+
+class JSONArrayStreamDecoder:
+    """Incrementally decode the items of a JSON array from chunks of
+    bytes, so that the full document never has to be held in memory.
+    """
+
+    def __init__(self) -> None:
+        """Initialize the decoder."""
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._json = json.JSONDecoder()
+        self._buffer = ""
+        self._started = False
+        self.done = False
 
+    def feed(self, chunk: bytes) -> list[Any]:
+        """Decode a chunk and return the array items it completed."""
+        buffer = self._buffer + self._text.decode(chunk)
+        items = []
+        pos = 0
+        while not self.done:
+            pos = _WHITESPACE.match(buffer, pos).end()  # type:ignore[union-attr]
+            if pos == len(buffer):
+                break
+            char = buffer[pos]
+            if not self._started:
+                if char != "[":
+                    msg = "Expected a JSON array."
+                    raise ValueError(msg)
+                self._started = True
+                pos += 1
+            elif char == "]":
+                self.done = True
+                pos += 1
+            elif char == ",":
+                pos += 1
+            else:
+                try:
+                    item, end = self._json.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    # The item is not complete yet.
+                    break
+                if end == len(buffer):
+                    # A number at the end may continue in the next chunk.
+                    break
+                items.append(item)
+                pos = end
+        # Only keep the undecoded remainder.
+        self._buffer = buffer[pos:]
+        return items
 
-async def fetch_gateway_kernels(synchronizer: SynchronizerSessionManager) -> None:
-    """Fetch running kernels from a Kernel/Enterprise Gateway."""
-    mkm = synchronizer.kernel_manager
-    response = await gateway_request(mkm.kernels_url, method="GET")
-    kernels = json_decode(response.body)
-    # Hydrate kernelmanager for all remote kernels
-    for k in kernels:
-        kernel = synchronizer.kernel_record_class(
-            kernel_id=k["id"], kernel_name=k["name"], alive=True
+    def close(self) -> None:
+        """Check that the whole array was decoded."""
+        if not self.done:
+            msg = "The JSON array ended unexpectedly."
+            raise ValueError(msg)
+
+
+class _KernelRecordStream:
+    """Builds kernel records while a kernel list response is received."""
+
+    def __init__(self, synchronizer: SynchronizerSessionManager, origin: str | None) -> None:
+        self.synchronizer = synchronizer
+        # Records are tagged with their origin if the record class has the field.
+        record_class = synchronizer.kernel_record_class
+        self.tags: dict[str, Any] = (
+            {"origin": origin} if origin and "origin" in record_class.fields() else {}
         )
-        synchronizer._kernel_records.update(kernel)
+        self._reset(accept=True)
+
+    def _reset(self, accept: bool) -> None:
+        self.accept = accept
+        self.decoder = JSONArrayStreamDecoder()
+        self.records: list[KernelRecord] = []
+        self.headers: dict[str, str] = {}
+        self.digest = hashlib.sha256()
+
+    def header_callback(self, line: str) -> None:
+        # Each response (including redirects and retries) starts with a
+        # status line; only the body of a successful one is decoded.
+        if line.startswith("HTTP/"):
+            parts = line.split(maxsplit=2)
+            self._reset(accept=len(parts) > 1 and parts[1] == "200")
+        else:
+            name, sep, value = line.partition(":")
+            if sep:
+                self.headers[name.strip().lower()] = value.strip()
+
+    def streaming_callback(self, chunk: bytes) -> None:
+        if self.accept:
+            self.digest.update(chunk)
+            record_class = self.synchronizer.kernel_record_class
+            self.records.extend(
+                record_class(kernel_id=k["id"], kernel_name=k["name"], alive=True, **self.tags)
+                for k in self.decoder.feed(chunk)
+            )
+
+
+class GatewayKernelPoller:
+    """Polls the kernel list of a Kernel/Enterprise Gateway.
+
+    The last kernel records are cached with the response's validators
+    (`ETag`/`Last-Modified`), which are sent back as conditional request
+    headers. When the gateway answers `304 Not Modified`, or sends a body
+    identical to the last one, the cached list object itself is returned,
+    so the synchronizer can tell that nothing changed.
+
+    After a failed poll, further polls fail fast with the same error until
+    an exponentially growing delay has passed. After a slow poll, the
+    cached records are reused for a delay proportional to the response
+    time.
+
+    The poller fetches `url` (by default, the kernel manager's
+    `kernels_url`), tags the records with its `origin`, and gives up on
+    polls that take longer than `timeout` seconds. With a `client`, it
+    polls over that client's keep-alive connections (with the Gateway
+    client's headers and TLS settings) instead of through Jupyter
+    Server's shared Gateway client.
+    """
+
+    # Delay (in seconds) after the first failure, doubled on each
+    # consecutive failure.
+    backoff_factor: float = 1.0
+    # Upper limit (in seconds) of any backoff delay.
+    max_backoff: float = 60.0
+    # Polls that take longer than this (in seconds) count as slow.
+    slow_response: float = 1.0
+    # Multiple of a slow poll's response time to wait before the next one.
+    slow_backoff_factor: float = 2.0
+
+    def __init__(
+        self,
+        url: str | None = None,
+        origin: str | None = None,
+        timeout: float | None = None,
+        client: KeepAliveHTTPClient | None = None,
+    ) -> None:
+        """Initialize the poller."""
+        self.url = url
+        self.origin = origin
+        self.timeout = timeout
+        self.client = client
+        self.records: list[KernelRecord] | None = None
+        self.etag: str | None = None
+        self.last_modified: str | None = None
+        self.fingerprint: str | None = None
+        self.failures = 0
+        self._error: Exception | None = None
+        self._retry_at = 0.0
+
+    def _conditional_headers(self) -> dict[str, str]:
+        headers = {}
+        if self.records is not None:
+            if self.etag:
+                headers["If-None-Match"] = self.etag
+            if self.last_modified:
+                headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def _backoff(self, error: Exception) -> None:
+        self.failures += 1
+        self._error = error
+        delay = self.backoff_factor * 2 ** (self.failures - 1)
+        self._retry_at = time.monotonic() + min(delay, self.max_backoff)
+
+    def _succeeded(self, start: float) -> None:
+        end = time.monotonic()
+        self.failures = 0
+        self._error = None
+        elapsed = end - start
+        if elapsed > self.slow_response:
+            self._retry_at = end + min(elapsed * self.slow_backoff_factor, self.max_backoff)
+        else:
+            self._retry_at = 0.0
+
+    async def _request(self, url: str, stream: _KernelRecordStream) -> None:
+        headers = self._conditional_headers()
+        if self.client is None:
+            await gateway_request(
+                url,
+                method="GET",
+                headers=headers,
+                header_callback=stream.header_callback,
+                streaming_callback=stream.streaming_callback,
+            )
+            return
+        gateway_client = GatewayClient.instance()
+        args = gateway_client.load_connection_args(headers=headers)  # type:ignore[no-untyped-call]
+        try:
+            response_headers = await self.client.fetch(
+                url,
+                header_callback=stream.header_callback,
+                streaming_callback=stream.streaming_callback,
+                **{name: args[name] for name in _CLIENT_ARGS if name in args},
+            )
+        except HTTPClientError as e:
+            msg = "Error from Gateway at %s: %s"
+            raise web.HTTPError(e.code, msg, url, e.message) from e
+        except (OSError, StreamClosedError) as e:
+            msg = "Could not connect to the Gateway at %s: %s"
+            raise web.HTTPError(503, msg, url, e) from e
+        if gateway_client.accept_cookies:
+            gateway_client.update_cookies(response_headers)
+
+    def close(self) -> None:
+        """Close the poller's HTTP client, if any."""
+        if self.client is not None:
+            self.client.close()
+
+    async def poll(self, synchronizer: SynchronizerSessionManager) -> list[KernelRecord]:
+        """Fetch the kernel records, reusing the cached ones when possible."""
+        start = time.monotonic()
+        if start < self._retry_at:
+            if self._error is not None:
+                msg = "Polling the gateway is backing off after %d failed attempt(s)."
+                raise web.HTTPError(503, msg, self.failures) from self._error
+            if self.records is not None:
+                return self.records
+
+        url = self.url or synchronizer.kernel_manager.kernels_url
+        stream = _KernelRecordStream(synchronizer, self.origin)
+        try:
+            await asyncio.wait_for(self._request(url, stream), self.timeout)
+            stream.decoder.close()
+        except web.HTTPError as e:
+            if e.status_code == 304 and self.records is not None:
+                self._succeeded(start)
+                return self.records
+            self._backoff(e)
+            raise
+        except Exception as e:
+            self._backoff(e)
+            raise
+
+        records = stream.records
+        fingerprint = stream.digest.hexdigest()
+        if self.records is not None and fingerprint == self.fingerprint:
+            # Without validators from the gateway, an identical body
+            # still means that nothing changed.
+            records = self.records
+        self.records = records
+        self.fingerprint = fingerprint
+        self.etag = stream.headers.get("etag")
+        self.last_modified = stream.headers.get("last-modified")
+        self._succeeded(start)
+        return records
+
+
+class FederatedKernelPoller:
+    """Polls the kernel lists of several gateways concurrently, each
+    through its own `GatewayKernelPoller`, and tags every record with the
+    URL of the gateway it came from.
+
+    A gateway that fails or times out does not fail the poll: its last
+    kernel records are reused (and a warning is logged), so it only
+    delays the changes to its own kernels. The same list object as the
+    last poll is returned while no gateway's kernels changed.
+    """
+
+    def __init__(
+        self,
+        gateway_urls: list[str],
+        timeout: float | None = None,
+        client: KeepAliveHTTPClient | None = None,
+    ) -> None:
+        """Initialize the poller."""
+        self.gateway_urls = gateway_urls
+        self.timeout = timeout
+        self.client = client
+        endpoint = GatewayClient.instance().kernels_endpoint
+        self.pollers = [
+            GatewayKernelPoller(
+                url=url_path_join(url, endpoint), origin=url, timeout=timeout, client=client
+            )
+            for url in gateway_urls
+        ]
+        self.records: list[KernelRecord] | None = None
+        self._polled: list[list[KernelRecord]] = []
+
+    async def _poll_gateway(
+        self, poller: GatewayKernelPoller, synchronizer: SynchronizerSessionManager
+    ) -> list[KernelRecord]:
+        try:
+            return await poller.poll(synchronizer)
+        except Exception as e:
+            synchronizer.log.warning("Could not poll the gateway at %s: %s", poller.origin, e)
+            SYNC_ERRORS_TOTAL.labels(phase="poll_gateway").inc()
+            if poller.records is None:
+                poller.records = []
+            return poller.records
+
+    def close(self) -> None:
+        """Close the HTTP client shared by the gateway pollers, if any."""
+        if self.client is not None:
+            self.client.close()
+
+    async def poll(self, synchronizer: SynchronizerSessionManager) -> list[KernelRecord]:
+        """Fetch the kernel records of all gateways."""
+        polled = await asyncio.gather(
+            *(self._poll_gateway(poller, synchronizer) for poller in self.pollers)
+        )
+        if self.records is not None and all(map(operator.is_, polled, self._polled)):
+            return self.records
+        self._polled = polled
+        self.records = [record for records in polled for record in records]
+        return self.records
+
+
+_pollers: weakref.WeakKeyDictionary[
+    SynchronizerSessionManager, GatewayKernelPoller | FederatedKernelPoller
+] = weakref.WeakKeyDictionary()
+
+
+def _make_poller(
+    synchronizer: SynchronizerSessionManager,
+) -> GatewayKernelPoller | FederatedKernelPoller:
+    gateway_urls = list(synchronizer.gateway_urls)
+    timeout = synchronizer.gateway_request_timeout
+    client = None
+    if synchronizer.gateway_keep_alive:
+        client = KeepAliveHTTPClient(
+            max_connections=synchronizer.gateway_max_connections,
+            connect_timeout=synchronizer.gateway_connect_timeout,
+        )
+    if gateway_urls:
+        return FederatedKernelPoller(gateway_urls, timeout=timeout, client=client)
+    if client is None:
+        # The Gateway client's own request timeout applies.
+        timeout = None
+    return GatewayKernelPoller(timeout=timeout, client=client)
+
+
+def close_gateway_poller(synchronizer: SynchronizerSessionManager) -> None:
+    """Close the connections used to poll gateways for a synchronizer."""
+    poller = _pollers.pop(synchronizer, None)
+    if poller is not None:
+        poller.close()
+
+
+async def fetch_gateway_kernels(synchronizer: SynchronizerSessionManager) -> list[KernelRecord]:
+    """Fetch running kernels from a Kernel/Enterprise Gateway, or from
+    each of the synchronizer's `gateway_urls`.
+
+    The response is decoded as it streams in, so the raw body is never
+    held in memory as a whole. Each synchronizer polls through its own
+    `GatewayKernelPoller` (or `FederatedKernelPoller`), which returns the
+    same list object as the last call when the kernels have not changed.
+    """
+    poller = _pollers.get(synchronizer)
+    if poller is None:
+        poller = _pollers[synchronizer] = _make_poller(synchronizer)
+    return await poller.poll(synchronizer)
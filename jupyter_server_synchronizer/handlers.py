@@ -0,0 +1,29 @@
+"""Synchronizer API handlers."""
+from __future__ import annotations
+
+import json
+
+from jupyter_server.auth.decorator import authorized
+from jupyter_server.base.handlers import APIHandler
+from tornado import web
+
+from .manager import SynchronizerSessionManager
+
+
+class SyncDiagnosticsHandler(APIHandler):  # type:ignore[misc]
+    """Dumps the synchronizer's full state on demand."""
+
+    auth_resource = "sessions"
+
+    @web.authenticated
+    @authorized
+    async def get(self) -> None:
+        """Get the synchronizer's diagnostics."""
+        manager = self.session_manager
+        if not isinstance(manager, SynchronizerSessionManager):
+            msg = "The session manager is not a SynchronizerSessionManager."
+            raise web.HTTPError(404, msg)
+        self.finish(json.dumps(manager.diagnostics()))
+
+
+default_handlers = [(r"/api/sync/diagnostics", SyncDiagnosticsHandler)]
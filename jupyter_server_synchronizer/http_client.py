@@ -0,0 +1,215 @@
+"""A keep-alive HTTP client for polling gateways."""
+from __future__ import annotations
+
+import base64
+import datetime as dt
+import ssl
+from typing import Callable, Optional, Tuple, cast
+from urllib.parse import urlsplit
+
+from tornado import httputil, locks
+from tornado.http1connection import HTTP1Connection, HTTP1ConnectionParameters
+from tornado.httpclient import HTTPClientError
+from tornado.iostream import IOStream, StreamClosedError
+from tornado.tcpclient import TCPClient
+
+# (scheme, host, port)
+_Host = Tuple[str, str, int]
+# (validate_cert, ca_certs, client_cert, client_key)
+_TLSOptions = Tuple[bool, Optional[str], Optional[str], Optional[str]]
+
+
+class _ResponseDelegate(httputil.HTTPMessageDelegate):
+    """Passes a response to the callbacks of a `KeepAliveHTTPClient.fetch`."""
+
+    def __init__(
+        self,
+        header_callback: Callable[[str], None] | None,
+        streaming_callback: Callable[[bytes], None] | None,
+    ) -> None:
+        self.header_callback = header_callback
+        self.streaming_callback = streaming_callback
+        self.start_line: httputil.ResponseStartLine | None = None
+        self.headers: httputil.HTTPHeaders | None = None
+
+    def headers_received(
+        self,
+        start_line: httputil.RequestStartLine | httputil.ResponseStartLine,
+        headers: httputil.HTTPHeaders,
+    ) -> None:
+        # Clients only receive responses.
+        start_line = cast(httputil.ResponseStartLine, start_line)
+        self.start_line = start_line
+        self.headers = headers
+        if self.header_callback is not None:
+            # Like Tornado's clients, pass the status line, each header
+            # line and the final empty line.
+            self.header_callback(f"{start_line.version} {start_line.code} {start_line.reason}\r\n")
+            for name, value in headers.get_all():
+                self.header_callback(f"{name}: {value}\r\n")
+            self.header_callback("\r\n")
+
+    def data_received(self, chunk: bytes) -> None:
+        if self.streaming_callback is not None:
+            self.streaming_callback(chunk)
+
+
+class KeepAliveHTTPClient:
+    """An HTTP/1.1 client that keeps its connections open between
+    requests, so that polling the same hosts again and again does not
+    pay for a TCP connection and a TLS handshake each time.
+
+    Tornado's `SimpleAsyncHTTPClient` closes its connection after every
+    request, and has no HTTP/2 support.
+
+    At most `max_connections` requests to the same host run at once; the
+    others wait for a connection. A connection that the server closed
+    while it was idle is replaced transparently.
+    """
+
+    _params = HTTP1ConnectionParameters(decompress=True)
+
+    def __init__(self, max_connections: int = 2, connect_timeout: float | None = None) -> None:
+        """Initialize the client."""
+        self.max_connections = max_connections
+        self.connect_timeout = connect_timeout
+        self._tcp_client = TCPClient()
+        self._idle: dict[_Host, list[IOStream]] = {}
+        self._semaphores: dict[_Host, locks.Semaphore] = {}
+        self._ssl_contexts: dict[_TLSOptions, ssl.SSLContext] = {}
+        # Counters, e.g. to check that connections are reused.
+        self.connections_opened = 0
+        self.requests = 0
+
+    def _ssl_context(self, options: _TLSOptions) -> ssl.SSLContext:
+        context = self._ssl_contexts.get(options)
+        if context is None:
+            validate_cert, ca_certs, client_cert, client_key = options
+            context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH, cafile=ca_certs)
+            if not validate_cert:
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+            if client_cert:
+                context.load_cert_chain(client_cert, client_key)
+            self._ssl_contexts[options] = context
+        return context
+
+    async def _connect(self, host: _Host, ssl_options: ssl.SSLContext | None) -> IOStream:
+        timeout = None
+        if self.connect_timeout is not None:
+            timeout = dt.timedelta(seconds=self.connect_timeout)
+        _, hostname, port = host
+        stream = await self._tcp_client.connect(
+            hostname, port, ssl_options=ssl_options, timeout=timeout
+        )
+        stream.set_nodelay(True)
+        self.connections_opened += 1
+        return stream
+
+    async def fetch(
+        self,
+        url: str,
+        *,
+        headers: dict[str, str] | None = None,
+        auth_username: str | None = None,
+        auth_password: str | None = None,
+        validate_cert: bool = True,
+        ca_certs: str | None = None,
+        client_cert: str | None = None,
+        client_key: str | None = None,
+        header_callback: Callable[[str], None] | None = None,
+        streaming_callback: Callable[[bytes], None] | None = None,
+    ) -> httputil.HTTPHeaders:
+        """Send a GET request, and return the response headers.
+
+        The keyword arguments mean the same as Tornado's `HTTPRequest`
+        arguments. Like Tornado's clients, an `HTTPClientError` is raised
+        if the response is not successful (including `304 Not Modified`).
+        """
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            msg = f"Unsupported URL: {url}"
+            raise ValueError(msg)
+        https = parts.scheme == "https"
+        host = (parts.scheme, parts.hostname, parts.port or (443 if https else 80))
+        ssl_options = None
+        if https:
+            ssl_options = self._ssl_context((validate_cert, ca_certs, client_cert, client_key))
+
+        request_headers = httputil.HTTPHeaders(headers or {})
+        request_headers.setdefault("Host", parts.netloc.rpartition("@")[2])
+        request_headers.setdefault("Accept-Encoding", "gzip")
+        if auth_username is not None:
+            credentials = f"{auth_username}:{auth_password or ''}".encode()
+            request_headers["Authorization"] = "Basic " + base64.b64encode(credentials).decode()
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        start_line = httputil.RequestStartLine("GET", path, "HTTP/1.1")
+
+        semaphore = self._semaphores.get(host)
+        if semaphore is None:
+            semaphore = self._semaphores[host] = locks.Semaphore(self.max_connections)
+        async with semaphore:
+            self.requests += 1
+            while True:
+                idle = self._idle.get(host)
+                reused = bool(idle)
+                stream = idle.pop() if idle else await self._connect(host, ssl_options)
+                delegate = _ResponseDelegate(header_callback, streaming_callback)
+                try:
+                    keep_alive = await self._exchange(stream, start_line, request_headers, delegate)
+                except StreamClosedError:
+                    stream.close()
+                    if reused and delegate.start_line is None:
+                        # The server closed the connection while it was idle.
+                        continue
+                    raise
+                except BaseException:
+                    # The response may not have been fully read.
+                    stream.close()
+                    raise
+                break
+        if keep_alive:
+            self._idle.setdefault(host, []).append(stream)
+        else:
+            stream.close()
+
+        response = delegate.start_line
+        if response is None or delegate.headers is None:
+            raise HTTPClientError(599, "Connection closed")
+        if not 200 <= response.code < 300:
+            raise HTTPClientError(response.code, response.reason)
+        return delegate.headers
+
+    async def _exchange(
+        self,
+        stream: IOStream,
+        start_line: httputil.RequestStartLine,
+        headers: httputil.HTTPHeaders,
+        delegate: _ResponseDelegate,
+    ) -> bool:
+        """Send a request and read its response; return whether the
+        connection can be used again.
+        """
+        connection = HTTP1Connection(stream, True, self._params)
+        connection.write_headers(start_line, headers)
+        connection.finish()
+        is_open = await connection.read_response(delegate)
+        response = delegate.start_line
+        return (
+            is_open
+            and not stream.closed()
+            and response is not None
+            and delegate.headers is not None
+            and response.version == "HTTP/1.1"
+            and delegate.headers.get("Connection", "").lower() != "close"
+        )
+
+    def close(self) -> None:
+        """Close all idle connections."""
+        for streams in self._idle.values():
+            for stream in streams:
+                stream.close()
+        self._idle.clear()
+        self._tcp_client.close()
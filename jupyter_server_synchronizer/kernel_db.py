@@ -1,16 +1,37 @@
 """Kernel database management."""
 from __future__ import annotations
 
+import asyncio
+import functools
 import pathlib
 import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable, Iterable, Iterator, TypeVar
 
-from traitlets import TraitError, Type, Unicode, validate
+from traitlets import CaselessStrEnum, Integer, TraitError, Type, Unicode, validate
 from traitlets.config.configurable import Configurable
 
 from .kernel_records import KernelRecord
 
+_T = TypeVar("_T")
+
+
+@dataclass
+class KernelTableChanges:
+    """The rows of a kernel table changed after a version, by rowid."""
+
+    # The version of the latest change.
+    version: int
+    # The current record of each changed row, or None if it was deleted.
+    records: dict[int, KernelRecord | None] = field(default_factory=dict)
+    # The owner of each changed row that was not deleted.
+    owners: dict[int, str | None] = field(default_factory=dict)
+    # Whether all rows were read, as the changes were no longer logged.
+    reset: bool = False
+
 
 class KernelTable(Configurable):
     """An SQLite database for recorded kernels in the current server."""
@@ -18,7 +39,16 @@ class KernelTable(Configurable):
     _table_name = "kerneltable"
     _connection = None
     _cursor = None
-    _ignored_fields = {"alive", "managed", "recorded"}  # noqa: RUF012
+    # The records last read by `list`, and the database version they were read at.
+    _list_cache: list[KernelRecord] | None = None
+    _list_cache_version: tuple[int, int] | None = None
+    _ignored_fields = frozenset({"alive", "managed", "recorded", "origin"})
+    # Table columns for each record class, computed once per class.
+    _columns_cache: dict[type[KernelRecord], tuple[str, ...]] = {}  # noqa: RUF012
+    # Columns recording which server owns a row, and until when (a Unix time).
+    _lease_columns = ("owner", "lease_expires")
+    # Every change to the table is appended to this log by triggers.
+    _changes_table_name = "kerneltable_changes"
 
     database_filepath = Unicode(
         default_value=":memory:",
@@ -52,6 +82,56 @@ class KernelTable(Configurable):
 
     kernel_record_class = Type(KernelRecord, klass=KernelRecord)
 
+    journal_mode = CaselessStrEnum(
+        ["DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"],
+        default_value="DELETE",
+        help=(
+            "The SQLite journal mode of the database. DELETE is the SQLite "
+            "default. WAL lets readers and the writer proceed concurrently "
+            "and needs fewer fsyncs, but only works if the database lives "
+            "on a local filesystem and every process using it runs on the "
+            "same host."
+        ),
+    ).tag(config=True)
+
+    synchronous = CaselessStrEnum(
+        ["OFF", "NORMAL", "FULL", "EXTRA"],
+        default_value="FULL",
+        help=(
+            "The SQLite synchronous setting. FULL is the SQLite default and "
+            "makes every commit durable on power loss. NORMAL needs fewer "
+            "fsyncs and is only safe from corruption in WAL mode."
+        ),
+    ).tag(config=True)
+
+    cache_size = Integer(
+        default_value=None,
+        allow_none=True,
+        help=(
+            "The SQLite page cache size. Positive values are pages, negative "
+            "values are KiB. If None, the SQLite default is used."
+        ),
+    ).tag(config=True)
+
+    mmap_size = Integer(
+        default_value=None,
+        allow_none=True,
+        help=(
+            "The maximum number of bytes of the database file to access "
+            "through memory-mapped I/O. If None, the SQLite default is used."
+        ),
+    ).tag(config=True)
+
+    change_log_retention = Integer(
+        default_value=10000,
+        min=0,
+        help=(
+            "The number of most recent changes kept in the change log by "
+            "`compact_change_log`. Readers that fall further behind read "
+            "the whole table again."
+        ),
+    ).tag(config=True)
+
     @property
     def cursor(self) -> sqlite3.Cursor:
         """Start a cursor and create a database called 'session'"""
@@ -59,21 +139,117 @@ class KernelTable(Configurable):
             self._cursor = self.connection.cursor()
             self._cursor.execute(
                 f"""CREATE TABLE IF NOT EXISTS {self._table_name}
-                ({', '.join(self._table_columns)})"""
+                ({', '.join(self._table_columns + self._lease_columns)})"""
             )
+            added = self._add_missing_columns(self._cursor)
+            self._create_indexes(self._cursor)
+            self._create_change_log(self._cursor, replace=added)
         return self._cursor
 
+    def _add_missing_columns(self, cursor: sqlite3.Cursor) -> bool:
+        """Add the columns that a table created by an older version lacks,
+        and return whether any was added.
+        """
+        added = False
+        existing = {row["name"] for row in cursor.execute(f"PRAGMA table_info({self._table_name})")}
+        for column in self._table_columns + self._lease_columns:
+            if column not in existing:
+                try:
+                    cursor.execute(f"ALTER TABLE {self._table_name} ADD COLUMN {column}")
+                except sqlite3.OperationalError as e:
+                    # Another server sharing the database may have added it.
+                    if "duplicate column" not in str(e):
+                        raise
+                added = True
+        return added
+
+    def _create_change_log(self, cursor: sqlite3.Cursor, replace: bool = False) -> None:
+        """Create the change log, and the triggers that append to it.
+
+        Each change gets a new, increasing version. Updates that only
+        extend a lease are not logged.
+        """
+        table, changes = self._table_name, self._changes_table_name
+        cursor.execute(
+            f"""CREATE TABLE IF NOT EXISTS {changes} (
+                version INTEGER PRIMARY KEY AUTOINCREMENT,
+                row_id INTEGER NOT NULL,
+                kernel_id,
+                operation TEXT NOT NULL
+            )"""
+        )
+        columns = [row["name"] for row in cursor.execute(f"PRAGMA table_info({table})")]
+        changed = " OR ".join(
+            f"NEW.{column} IS NOT OLD.{column}" for column in columns if column != "lease_expires"
+        )
+        if replace:
+            # The table has new columns, which the update trigger must compare.
+            cursor.execute(f"DROP TRIGGER IF EXISTS {changes}_update")
+        for operation, when, row in (
+            ("insert", "", "NEW"),
+            ("update", f"WHEN {changed}", "NEW"),
+            ("delete", "", "OLD"),
+        ):
+            cursor.execute(
+                f"""CREATE TRIGGER IF NOT EXISTS {changes}_{operation}
+                AFTER {operation.upper()} ON {table} {when}
+                BEGIN
+                    INSERT INTO {changes} (row_id, kernel_id, operation)
+                    VALUES ({row}.rowid, {row}.kernel_id, '{operation}');
+                END"""  # noqa: S608
+            )
+
+    def _create_indexes(self, cursor: sqlite3.Cursor) -> None:
+        """Create a unique index on every identifier column."""
+        for column in self._identifier_columns:
+            # Tables written before identifiers were unique may hold
+            # duplicate rows; keep the oldest one.
+            cursor.execute(
+                f"""DELETE FROM {self._table_name} WHERE {column} IS NOT NULL
+                AND rowid NOT IN (
+                    SELECT MIN(rowid) FROM {self._table_name}
+                    WHERE {column} IS NOT NULL GROUP BY {column}
+                )"""  # noqa: S608
+            )
+            cursor.execute(
+                f"""CREATE UNIQUE INDEX IF NOT EXISTS {self._table_name}_{column}
+                ON {self._table_name} ({column})"""
+            )
+
     @property
     def connection(self) -> sqlite3.Connection:
         """Start a database connection"""
         if self._connection is None:
-            self._connection = sqlite3.connect(self.database_filepath, isolation_level=None)
+            # The connection may be used from an AsyncKernelTable's thread.
+            self._connection = sqlite3.connect(
+                self.database_filepath, isolation_level=None, check_same_thread=False
+            )
             self._connection.row_factory = sqlite3.Row
+            self._set_pragmas(self._connection)
         return self._connection
 
+    def _set_pragmas(self, connection: sqlite3.Connection) -> None:
+        """Apply the configured SQLite pragmas to a new connection."""
+        pragmas: dict[str, Any] = {
+            "journal_mode": self.journal_mode,
+            "synchronous": self.synchronous,
+            "cache_size": self.cache_size,
+            "mmap_size": self.mmap_size,
+        }
+        for name, value in pragmas.items():
+            if value is not None:
+                connection.execute(f"PRAGMA {name}={value}")
+
     @property
-    def _table_columns(self) -> set[str]:
-        return set(self.kernel_record_class.fields()).difference(self._ignored_fields)
+    def _table_columns(self) -> tuple[str, ...]:
+        record_class = self.kernel_record_class
+        columns = self._columns_cache.get(record_class)
+        if columns is None:
+            columns = tuple(
+                field for field in record_class.fields() if field not in self._ignored_fields
+            )
+            self._columns_cache[record_class] = columns
+        return columns
 
     def query(self, query_string: str, **identifiers: Any) -> None:
         """Build and execute a query."""
@@ -85,74 +261,265 @@ class KernelTable(Configurable):
             self.cursor.execute(query, tuple(identifiers.values()))
         else:
             err_message = "A valid identifying field for a Kernel Record was not given."
-            identifiers_list = [
-                field
-                for field in self.kernel_record_class  # type:ignore[attr-defined]
-                if field.endswith("_id")
-            ]
+            identifiers_list = self.kernel_record_class.get_identifier_fields()
             if identifiers_list:
                 err_message += f" Examples include: {identifiers_list}"
             raise Exception(err_message)
 
+    @property
+    def _identifier_columns(self) -> list[str]:
+        return [
+            field
+            for field in self.kernel_record_class.get_identifier_fields()
+            if field in self._table_columns
+        ]
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Cursor]:
+        """Run the enclosed statements in a single transaction, which is
+        rolled back if an exception is raised. Nested calls join the
+        outer transaction.
+        """
+        cursor = self.cursor
+        if self.connection.in_transaction:
+            yield cursor
+            return
+        cursor.execute("BEGIN")
+        try:
+            yield cursor
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+        cursor.execute("COMMIT")
+
+    def _column_values(self, record: KernelRecord) -> list[Any]:
+        """The value of each table column for a record; unset fields are NULL."""
+        return [getattr(record, column, None) or None for column in self._table_columns]
+
+    def _identifier_values(self, record: KernelRecord) -> list[Any]:
+        return [getattr(record, column, None) or None for column in self._identifier_columns]
+
     def save(self, record: KernelRecord) -> None:
         """Save a record."""
-        fields = {k: v for k, v in record.get_active_fields().items() if k in self._table_columns}
-        columns = ",".join(fields.keys())
-        values_tuple = tuple(fields.values())
-        values = str(values_tuple) if len(values_tuple) > 1 else f"('{values_tuple[0]}')"
-        self.cursor.execute(f"INSERT INTO {self._table_name} ({columns}) VALUES {values}")  # noqa: S608
+        self.save_many([record])
+
+    def save_many(self, records: Iterable[KernelRecord]) -> None:
+        """Save many records in a single transaction."""
+        columns = ", ".join(self._table_columns)
+        placeholders = ", ".join("?" for _ in self._table_columns)
+        statement = f"INSERT INTO {self._table_name} ({columns}) VALUES ({placeholders})"  # noqa: S608
+        with self.transaction() as cursor:
+            cursor.executemany(statement, (self._column_values(r) for r in records))
+
+    def upsert(self, record: KernelRecord) -> None:
+        """Save a record, or update the stored record with the same identifiers."""
+        self.upsert_many([record])
+
+    def upsert_many(self, records: Iterable[KernelRecord]) -> None:
+        """Save or update many records in a single transaction, with one
+        statement per record. Unset fields leave stored values unchanged.
+        """
+        columns = ", ".join(self._table_columns)
+        placeholders = ", ".join("?" for _ in self._table_columns)
+        updates = ", ".join(
+            f"{column}=COALESCE(excluded.{column}, {column})" for column in self._table_columns
+        )
+        # SQLite supports one conflict clause per unique index since 3.35;
+        # older versions only accept a single clause.
+        targets = self._identifier_columns
+        if sqlite3.sqlite_version_info < (3, 35):
+            targets = targets[:1]
+        conflicts = " ".join(f"ON CONFLICT({column}) DO UPDATE SET {updates}" for column in targets)
+        statement = (
+            f"INSERT INTO {self._table_name} ({columns}) VALUES ({placeholders}) {conflicts}"  # noqa: S608
+        )
+        with self.transaction() as cursor:
+            cursor.executemany(statement, (self._column_values(r) for r in records))
 
     def exists(self, **identifier: Any) -> bool:
         """Check to see if the session of a given name exists"""
-        record = self.kernel_record_class(**identifier)
-        self.cursor.execute(
-            f"SELECT * FROM {self._table_name} WHERE kernel_id='{record.kernel_id}'"  # noqa: S608
-        )
-        row = self.cursor.fetchone()
-        if row is not None:
-            return True
-        return False
+        self.query("SELECT 1 FROM {table} WHERE {0}=?", **identifier)
+        return self.cursor.fetchone() is not None
 
     def update(self, record: KernelRecord) -> None:
         """Update a record."""
-        found = False
-        for record_field in record.get_identifier_fields():
-            record_id = getattr(record, record_field)
-            if record_id and self.exists(**{record_field: record_id}):
-                found = True
-                break
-
-        if not found:
-            msg = (
-                "No KernelRecord found in the KernelTable. "
-                "If this is a new record, use the `.save` method to store "
-                "the KernelRecord."
-            )
-            raise Exception(msg)
+        self.update_many([record])
 
-        # Build the query for updating columns.
-        fields = {k: v for k, v in record.get_active_fields().items() if k in self._table_columns}
-        updates = []
-        for key, value in fields.items():
-            updates.append(f"{key}='{value}'")
-        update_string = ", ".join(updates)
-        x = f"UPDATE {self._table_name} SET {update_string} WHERE {record_field}='{record_id}';"  # noqa: S608
-        self.cursor.execute(x)
+    def update_many(self, records: Iterable[KernelRecord]) -> None:
+        """Update many records in a single transaction. A row matches a
+        record if any of their identifiers are equal. Unset fields
+        leave the stored values unchanged.
+        """
+        params = [self._column_values(r) + self._identifier_values(r) for r in records]
+        updates = ", ".join(f"{column}=COALESCE(?, {column})" for column in self._table_columns)
+        conditions = " OR ".join(f"{column}=?" for column in self._identifier_columns)
+        statement = f"UPDATE {self._table_name} SET {updates} WHERE {conditions}"  # noqa: S608
+        with self.transaction() as cursor:
+            cursor.executemany(statement, params)
+            if cursor.rowcount < len(params):
+                msg = (
+                    "No KernelRecord found in the KernelTable. "
+                    "If this is a new record, use the `.save` method to store "
+                    "the KernelRecord."
+                )
+                raise Exception(msg)
 
     def delete(self, **identifier: Any) -> None:
         """Delete a record."""
         self.query("DELETE FROM {table} WHERE {0}=?", **identifier)
 
+    def delete_many(self, records: Iterable[KernelRecord]) -> None:
+        """Delete the rows matching any identifier of the given records
+        in a single transaction.
+        """
+        conditions = " OR ".join(f"{column}=?" for column in self._identifier_columns)
+        statement = f"DELETE FROM {self._table_name} WHERE {conditions}"  # noqa: S608
+        with self.transaction() as cursor:
+            cursor.executemany(statement, (self._identifier_values(r) for r in records))
+
     def row_to_record(self, row: sqlite3.Row) -> KernelRecord:
         """Convert a row to a record."""
         items = {field: row[field] for field in self._table_columns}
         return self.kernel_record_class(**items)
 
+    @property
+    def version(self) -> tuple[int, int]:
+        """A version of the database contents, which changes whenever it
+        is written to.
+
+        `PRAGMA data_version` changes when another connection, possibly
+        in another process, commits; it does not see this connection's
+        own writes, which are counted by `total_changes`. Neither reads
+        any table.
+        """
+        cursor = self.cursor
+        (data_version,) = cursor.execute("PRAGMA data_version").fetchone()
+        return data_version, self.connection.total_changes
+
+    def _read(self) -> list[KernelRecord]:
+        """Read all rows, unless the database did not change since."""
+        version = self.version
+        if self._list_cache is None or version != self._list_cache_version:
+            self.cursor.execute(f"SELECT * FROM {self._table_name}")  # noqa: S608
+            rows = self.cursor.fetchall()
+            self._list_cache = [self.row_to_record(row) for row in rows]
+            self._list_cache_version = version
+        return self._list_cache
+
     def list(self) -> list[KernelRecord]:
-        """List all records."""
-        self.cursor.execute(f"SELECT * FROM {self._table_name}")  # noqa: S608
-        rows = self.cursor.fetchall()
-        return [self.row_to_record(row) for row in rows]
+        """List all records.
+
+        The records are cached, and only read again from the database
+        when its `version` changed. Copies are returned, so callers may
+        change them freely.
+        """
+        return [record.copy() for record in self._read()]
+
+    def leases(self) -> dict[str, tuple[str, float]]:
+        """The owner and lease expiry time of every leased record, by kernel_id."""
+        rows = self.cursor.execute(
+            f"SELECT kernel_id, owner, lease_expires FROM {self._table_name} "  # noqa: S608
+            "WHERE owner IS NOT NULL"
+        ).fetchall()
+        return {row["kernel_id"]: (row["owner"], row["lease_expires"] or 0.0) for row in rows}
+
+    @property
+    def change_version(self) -> int:
+        """The version of the latest change logged."""
+        row = self.cursor.execute(
+            "SELECT seq FROM sqlite_sequence WHERE name=?", (self._changes_table_name,)
+        ).fetchone()
+        return int(row["seq"]) if row else 0
+
+    def changes_since(self, version: int | None) -> KernelTableChanges:
+        """The rows changed after a `change_version`, as they are now.
+
+        If `version` is None, or the change log was compacted past it,
+        every row is returned, with `reset` set: rows that are not
+        returned were deleted.
+        """
+        table, changes = self._table_name, self._changes_table_name
+        with self.transaction() as cursor:
+            latest = self.change_version
+            (oldest,) = cursor.execute(f"SELECT MIN(version) FROM {changes}").fetchone()  # noqa: S608
+            if version == latest:
+                return KernelTableChanges(version=latest)
+            # Versions are consecutive until the log is compacted.
+            reset = version is None or version > latest or version < (oldest or latest + 1) - 1
+            if reset:
+                cursor.execute(f"SELECT rowid AS row_id, * FROM {table}")  # noqa: S608
+            else:
+                cursor.execute(
+                    f"""SELECT changed.row_id, {table}.rowid IS NOT NULL AS present, {table}.*
+                    FROM (SELECT DISTINCT row_id FROM {changes} WHERE version>?) AS changed
+                    LEFT JOIN {table} ON {table}.rowid=changed.row_id""",  # noqa: S608
+                    (version,),
+                )
+            result = KernelTableChanges(version=latest, reset=reset)
+            for row in cursor.fetchall():
+                if reset or row["present"]:
+                    result.records[row["row_id"]] = self.row_to_record(row)
+                    result.owners[row["row_id"]] = row["owner"]
+                else:
+                    result.records[row["row_id"]] = None
+        return result
+
+    def compact_change_log(self) -> None:
+        """Drop all but the last `change_log_retention` changes from the
+        change log, once it holds a tenth more than that.
+        """
+        changes = self._changes_table_name
+        retention = self.change_log_retention
+        latest = self.change_version
+        (oldest,) = self.cursor.execute(f"SELECT MIN(version) FROM {changes}").fetchone()  # noqa: S608
+        if oldest is None or latest - oldest + 1 <= retention + retention // 10:
+            return
+        with self.transaction() as cursor:
+            cursor.execute(
+                f"DELETE FROM {changes} WHERE version<=?",  # noqa: S608
+                (latest - retention,),
+            )
+
+    def claim_many(
+        self, records: Iterable[KernelRecord], owner: str, lease_expires: float, now: float
+    ) -> set[str]:
+        """Lease the rows of the given records to `owner` until
+        `lease_expires`, in a single transaction, and return the
+        kernel_ids that `owner` now holds.
+
+        A row is only taken over if it is not leased, already leased to
+        `owner`, or its lease expired at `now`. Records without a row get
+        a new row that only holds their kernel_id and lease.
+        """
+        kernel_ids = [record.kernel_id for record in records if record.kernel_id]
+        statement = (
+            f"INSERT INTO {self._table_name} (kernel_id, owner, lease_expires) VALUES (?, ?, ?) "  # noqa: S608
+            "ON CONFLICT(kernel_id) DO UPDATE SET "
+            "owner=excluded.owner, lease_expires=excluded.lease_expires "
+            "WHERE owner IS NULL OR owner=excluded.owner OR lease_expires<=?"
+        )
+        claimed = set()
+        with self.transaction() as cursor:
+            cursor.executemany(
+                statement, ((kernel_id, owner, lease_expires, now) for kernel_id in kernel_ids)
+            )
+            for kernel_id in kernel_ids:
+                cursor.execute(
+                    f"SELECT owner FROM {self._table_name} WHERE kernel_id=?",  # noqa: S608
+                    (kernel_id,),
+                )
+                row = cursor.fetchone()
+                if row is not None and row["owner"] == owner:
+                    claimed.add(kernel_id)
+        return claimed
+
+    def renew_leases(self, owner: str, lease_expires: float) -> None:
+        """Extend all leases held by `owner` until `lease_expires`."""
+        with self.transaction() as cursor:
+            cursor.execute(
+                f"UPDATE {self._table_name} SET lease_expires=? WHERE owner=?",  # noqa: S608
+                (lease_expires, owner),
+            )
 
     def get(self, **identifier: Any) -> KernelRecord:
         """Get a record."""
@@ -162,3 +529,61 @@ class KernelTable(Configurable):
             msg = "No match was found in database."
             raise Exception(msg)
         return self.row_to_record(row)
+
+
+class AsyncKernelTable:
+    """An async facade over a KernelTable.
+
+    All calls run, one at a time, on a dedicated database thread, so
+    that slow SQLite I/O does not block the event loop.
+    """
+
+    def __init__(self, table: KernelTable) -> None:
+        """Initialize the facade."""
+        self.table = table
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="kernel-table")
+
+    async def run(self, func: Callable[..., _T], *args: Any, **kwargs: Any) -> _T:
+        """Run any blocking database function on the database thread."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def list(self) -> list[KernelRecord]:
+        """List all records."""
+        return await self.run(self.table.list)
+
+    async def get(self, **identifier: Any) -> KernelRecord:
+        """Get a record."""
+        return await self.run(self.table.get, **identifier)
+
+    async def exists(self, **identifier: Any) -> bool:
+        """Check to see if a record exists."""
+        return await self.run(self.table.exists, **identifier)
+
+    async def save_many(self, records: Iterable[KernelRecord]) -> None:
+        """Save many records in a single transaction."""
+        await self.run(self.table.save_many, list(records))
+
+    async def update_many(self, records: Iterable[KernelRecord]) -> None:
+        """Update many records in a single transaction."""
+        await self.run(self.table.update_many, list(records))
+
+    async def upsert(self, record: KernelRecord) -> None:
+        """Save a record, or update the stored record with the same identifiers."""
+        await self.run(self.table.upsert, record)
+
+    async def upsert_many(self, records: Iterable[KernelRecord]) -> None:
+        """Save or update many records in a single transaction."""
+        await self.run(self.table.upsert_many, list(records))
+
+    async def delete(self, **identifier: Any) -> None:
+        """Delete a record."""
+        await self.run(self.table.delete, **identifier)
+
+    async def delete_many(self, records: Iterable[KernelRecord]) -> None:
+        """Delete many records in a single transaction."""
+        await self.run(self.table.delete_many, list(records))
+
+    def close(self) -> None:
+        """Stop the database thread once pending calls are done."""
+        self._executor.shutdown(wait=False)
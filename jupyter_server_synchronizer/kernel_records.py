@@ -1,7 +1,9 @@
 """Kernel records management."""
 from __future__ import annotations
 
-from dataclasses import dataclass, fields
+from dataclasses import dataclass, fields, replace
+from dataclasses import field as dataclass_field
+from typing import Iterator, TypeVar, cast
 
 from jupyter_client.manager import KernelManager
 
@@ -12,6 +14,54 @@ class KernelRecordConflict(Exception):
     """
 
 
+_T = TypeVar("_T")
+
+
+# Field metadata is computed once per record class.
+_FIELD_NAMES: dict[type, tuple[str, ...]] = {}
+_IDENTIFIER_FIELD_NAMES: dict[type, tuple[str, ...]] = {}
+
+
+def _field_names(cls: type) -> tuple[str, ...]:
+    """The dataclass field names of a record class."""
+    names = _FIELD_NAMES.get(cls)
+    if names is None:
+        names = _FIELD_NAMES[cls] = tuple(f.name for f in fields(cls))
+    return names
+
+
+def _identifier_field_names(cls: type) -> tuple[str, ...]:
+    """The identifier field names (ending in `_id`) of a record class."""
+    names = _IDENTIFIER_FIELD_NAMES.get(cls)
+    if names is None:
+        names = tuple(name for name in _field_names(cls) if name.endswith("_id"))
+        _IDENTIFIER_FIELD_NAMES[cls] = names
+    return names
+
+
+def _field_values(record: KernelRecord) -> tuple[object, ...]:
+    """The values of all fields of a record, used for change detection."""
+    return tuple(getattr(record, name) for name in _field_names(type(record)))
+
+
+def _with_slots(cls: type[_T]) -> type[_T]:
+    """Rebuild a dataclass with `__slots__` for its fields.
+
+    This mirrors `dataclass(slots=True)`, which is only available
+    on Python 3.10+.
+    """
+    cls_dict = dict(cls.__dict__)
+    field_names = _field_names(cls)
+    cls_dict["__slots__"] = field_names
+    for name in field_names:
+        # The defaults are already captured by the generated __init__.
+        cls_dict.pop(name, None)
+    cls_dict.pop("__dict__", None)
+    cls_dict.pop("__weakref__", None)
+    return cast("type[_T]", type(cls.__name__, cls.__bases__, cls_dict))
+
+
+@_with_slots
 @dataclass
 class KernelRecord:
     """A dataclass that keeps a record of kernels maintained
@@ -29,11 +79,13 @@ class KernelRecord:
     alive: None | bool = None
     recorded: None | bool = None
     managed: None | bool = None
+    # Where a running kernel was found, e.g. the URL of its gateway.
+    origin: None | str = None
 
     @classmethod
     def fields(cls) -> list[str]:
         """Get the fields."""
-        return [f.name for f in fields(cls)]
+        return list(_field_names(cls))
 
     @classmethod
     def from_manager(cls, manager: KernelManager) -> KernelRecord:
@@ -41,7 +93,7 @@ class KernelRecord:
         record = cls()
         # Look for the record fields as attributes the kernel manager
         # and make the values match.
-        for field in cls.get_identifier_fields():
+        for field in _identifier_field_names(cls):
             setattr(record, field, getattr(manager, field, None))
         record.kernel_name = manager.kernel_name
         record.managed = True
@@ -50,24 +102,16 @@ class KernelRecord:
     @classmethod
     def get_identifier_fields(cls) -> list[str]:
         """The identifier keys/labels for a KernelRecord."""
-        identifier_fields: list[str] = []
-        for field in fields(cls):
-            if field.name.endswith("_id"):
-                identifier_fields.append(field.name)
-        return identifier_fields
+        return list(_identifier_field_names(cls))
 
     def get_identifier_values(self) -> list[str | None]:
         """The values of all identifiers."""
-        identifier_values: list[str | None] = []
-        for id_ in self.get_identifier_fields():
-            if id_.endswith("_id"):
-                identifier_values.append(getattr(self, id_))
-        return identifier_values
+        return [getattr(self, id_) for id_ in _identifier_field_names(type(self))]
 
     def get_active_identifiers(self) -> dict[str, str]:
         """Return a dictionary of all identifiers that are not None."""
         identifiers: dict[str, str] = {}
-        for id_ in self.get_identifier_fields():
+        for id_ in _identifier_field_names(type(self)):
             val = getattr(self, id_)
             if val is not None:
                 identifiers[id_] = val
@@ -76,12 +120,16 @@ class KernelRecord:
     def get_active_fields(self) -> dict[str, str]:
         """Get a list of all fields that are not None"""
         items: dict[str, str] = {}
-        for field in fields(self):
-            value = getattr(self, field.name)
+        for name in _field_names(type(self)):
+            value = getattr(self, name)
             if value:
-                items[field.name] = value
+                items[name] = value
         return items
 
+    def copy(self) -> KernelRecord:
+        """Return a shallow copy of this record."""
+        return replace(self)
+
     def __eq__(self, other: object) -> bool:
         """Two kernel records are equivalent if *any* of their
         unique identifiers (keys ending in `_id`) are equal.
@@ -121,9 +169,25 @@ class KernelRecord:
             msg = "Could not update the record from 'other' because the two records conflict."
             raise KernelRecordConflict(msg)
 
-        for field in fields(self):
-            if hasattr(other, field.name) and getattr(other, field.name):
-                setattr(self, field.name, getattr(other, field.name))
+        for name in _field_names(type(self)):
+            value = getattr(other, name, None)
+            if value:
+                setattr(self, name, value)
+
+
+@dataclass
+class KernelRecordDelta:
+    """The records added, removed and changed between two
+    observations of the same kernel source.
+    """
+
+    added: list[KernelRecord] = dataclass_field(default_factory=list)
+    removed: list[KernelRecord] = dataclass_field(default_factory=list)
+    changed: list[KernelRecord] = dataclass_field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        """True if anything changed."""
+        return bool(self.added or self.removed or self.changed)
 
 
 class KernelRecordList:
@@ -131,57 +195,136 @@ class KernelRecordList:
     When adding a record to the list, first checks if the record
     already exists. If it does, the record will be updated with
     the new information.
+
+    Records are indexed by each of their identifier fields (keys ending
+    in `_id`), so lookups, merges and removals do not scan the list.
     """
 
     def __init__(self, *records: KernelRecord) -> None:
         """Initialize the record list."""
-        self._records: list[KernelRecord] = []
+        # Records keyed by object identity; dicts preserve insertion order.
+        self._records_by_ref: dict[int, KernelRecord] = {}
+        # Maps an identifier field to {identifier value: record}.
+        self._index: dict[str, dict[str, KernelRecord]] = {}
+        # The (field, value) pairs each record is currently indexed under.
+        self._indexed_keys: dict[int, list[tuple[str, str]]] = {}
         for record in records:
             self.update(record)
 
+    @property
+    def _records(self) -> list[KernelRecord]:
+        """A snapshot of the records in insertion order."""
+        return list(self._records_by_ref.values())
+
     def __str__(self) -> str:
         """Str repr of the record list."""
         return str(self._records)
 
+    def __iter__(self) -> Iterator[KernelRecord]:
+        """Iterate over a snapshot of the records."""
+        return iter(self._records)
+
     def __contains__(self, record: KernelRecord | str) -> bool:
         """Search for records by kernel_id and session_id"""
-        if isinstance(record, KernelRecord) and record in self._records:
-            return True
-
         if isinstance(record, str):
-            for r in self._records:
-                if record in r.get_identifier_values():
-                    return True
-        return False
+            return self._find_by_value(record) is not None
+        return self._find(record) is not None
 
     def __len__(self) -> int:
         """Length of the record list."""
-        return len(self._records)
+        return len(self._records_by_ref)
+
+    def _find(self, record: KernelRecord) -> KernelRecord | None:
+        """Find the stored record equivalent to the given record."""
+        for field, value in record.get_active_identifiers().items():
+            found = self._index.get(field, {}).get(value)
+            # Compare the full records, so that conflicting identifiers
+            # raise a KernelRecordConflict just like a linear scan would.
+            if found is not None and found == record:
+                return found
+        return None
+
+    def _find_by_value(self, value: str) -> KernelRecord | None:
+        """Find a stored record with any identifier matching the given value."""
+        for index in self._index.values():
+            found = index.get(value)
+            if found is not None:
+                return found
+        return None
+
+    def _unindex(self, record: KernelRecord) -> None:
+        for field, value in self._indexed_keys.pop(id(record), []):
+            index = self._index.get(field, {})
+            if index.get(value) is record:
+                del index[value]
+
+    def _reindex(self, record: KernelRecord) -> None:
+        self._unindex(record)
+        keys = list(record.get_active_identifiers().items())
+        for field, value in keys:
+            self._index.setdefault(field, {})[value] = record
+        self._indexed_keys[id(record)] = keys
 
     def get(self, record: KernelRecord | str) -> KernelRecord:
         """get a record."""
+        found = None
         if isinstance(record, str):
-            for r in self._records:
-                if record in r.get_identifier_values():
-                    return r
+            found = self._find_by_value(record)
         elif isinstance(record, KernelRecord):
-            for r in self._records:
-                if record == r:
-                    return record
-        msg = f"{record} not found in KernelRecordList."
-        raise ValueError(msg)
+            found = self._find(record)
+        if found is None:
+            msg = f"{record} not found in KernelRecordList."
+            raise ValueError(msg)
+        return found
 
     def update(self, record: KernelRecord) -> None:
         """Update a record in-place or append it if not in the list."""
-        try:
-            idx = self._records.index(record)
-            self._records[idx].update(record)
-        except ValueError:
-            self._records.append(record)
+        found = self._find(record)
+        if found is not None:
+            found.update(record)
+        else:
+            found = record
+            self._records_by_ref[id(record)] = record
+        # Merging may have added or changed identifiers.
+        self._reindex(found)
+
+    def reindex(self, record: KernelRecord) -> None:
+        """Refresh the index for a stored record whose identifiers were
+        changed in-place (e.g. a `kernel_id` assigned after the record
+        was added).
+        """
+        if id(record) in self._records_by_ref:
+            self._reindex(record)
 
     def remove(self, record: KernelRecord) -> None:
         """Remove a record if its found in the list. If it's not found,
         do nothing.
         """
-        if record in self._records:
-            self._records.remove(record)
+        found = self._find(record)
+        if found is not None:
+            self._unindex(found)
+            del self._records_by_ref[id(found)]
+
+    def _find_or_none(self, record: KernelRecord) -> KernelRecord | None:
+        """Like `_find`, but treat conflicting records as not found."""
+        try:
+            return self._find(record)
+        except KernelRecordConflict:
+            return None
+
+    def diff(self, previous: KernelRecordList) -> KernelRecordDelta:
+        """Compare this list against a previous observation of the same
+        records. Records whose identifiers now conflict with a previous
+        record are reported as one removal and one addition.
+        """
+        delta = KernelRecordDelta()
+        for record in self._records_by_ref.values():
+            old = previous._find_or_none(record)
+            if old is None:
+                delta.added.append(record)
+            elif _field_values(old) != _field_values(record):
+                delta.changed.append(record)
+        for old in previous._records_by_ref.values():
+            if self._find_or_none(old) is None:
+                delta.removed.append(old)
+        return delta
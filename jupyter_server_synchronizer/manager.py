@@ -2,19 +2,104 @@
 from __future__ import annotations
 
 import asyncio
+import contextlib
+import dataclasses
+import functools
+import math
+import os
+import socket
+import sqlite3
+import time
 import typing as t
 import uuid
+import warnings
 
-from jupyter_server.services.sessions.sessionmanager import KernelSessionRecordList, SessionManager
-from traitlets import Bool, Float, Instance, Type, default
+from jupyter_server.gateway.gateway_client import GatewayClient
+from jupyter_server.services.sessions.sessionmanager import (
+    KernelSessionRecord,
+    KernelSessionRecordList,
+    SessionManager,
+)
+from jupyter_server.utils import ensure_async
+from tornado import locks, web
+from traitlets import (
+    Bool,
+    CaselessStrEnum,
+    Dict,
+    Float,
+    Instance,
+    Integer,
+    List,
+    TraitError,
+    Type,
+    Unicode,
+    default,
+    validate,
+)
 
-from .gateway import fetch_gateway_kernels
-from .kernel_db import KernelTable
-from .kernel_records import KernelRecord, KernelRecordList
+from .coordinator import SyncCoordinator
+from .gateway import close_gateway_poller, fetch_gateway_kernels
+from .kernel_db import AsyncKernelTable, KernelTable
+from .kernel_records import (
+    KernelRecord,
+    KernelRecordConflict,
+    KernelRecordDelta,
+    KernelRecordList,
+)
+from .metrics import SYNC_ERRORS_TOTAL, SYNC_KERNELS_TOTAL, instrument_phase, observe_phase
+from .scheduler import SyncScheduler
 from .traits import Awaitable
 
 # mypy: disable-error-code="no-untyped-call"
 
+KERNEL_ACTIONS_SCHEMA_ID = "https://events.jupyter.org/jupyter_server/kernel_actions/v1"
+
+
+@dataclasses.dataclass
+class RecordedKernelsRead:
+    """The changes read from the kernel table, and the state the read
+    moves to, which is only saved once the changes have been merged.
+    """
+
+    delta: KernelRecordDelta
+    version: int
+    # The changed rows by rowid; None for deleted rows.
+    rows: dict[int, KernelRecord | None]
+    # The kernels leased by other servers and when the first lease
+    # expires, if the leases were read again.
+    foreign: tuple[frozenset[str], float] | None = None
+
+
+class SyncSummary:
+    """A summary of the kernel records fetched by a sync, formatted
+    lazily (i.e. only when it is logged): the number of records seen by
+    each kernel source, the changes in each source, and the changed
+    records.
+    """
+
+    def __init__(
+        self, manager: SynchronizerSessionManager, deltas: dict[str, KernelRecordDelta]
+    ) -> None:
+        """Initialize the summary."""
+        self.manager = manager
+        self.deltas = deltas
+
+    def __str__(self) -> str:
+        """Format the summary."""
+        manager = self.manager
+        sources = ", ".join(
+            f"{source}={len(observed)}" for source, observed in manager._observed_records.items()
+        )
+        changes = ", ".join(
+            f"{source}=+{len(d.added)}/-{len(d.removed)}/~{len(d.changed)}"
+            for source, d in self.deltas.items()
+        )
+        changed = [r for d in self.deltas.values() for r in d.added + d.removed + d.changed]
+        return (
+            f"{len(manager._kernel_records)} records ({sources}); "
+            f"changes ({changes}); changed records: {changed}"
+        )
+
 
 class SynchronizerSessionManager(SessionManager):  # type:ignore[misc]
     """A Jupyter Server Session Manager that rehydrates sessions/kernels on server restart."""
@@ -31,24 +116,193 @@ class SynchronizerSessionManager(SessionManager):  # type:ignore[misc]
 
     syncing_interval = Float(
         default_value=5.0,
-        help="Interval (in seconds) for each call to the periodic syncing method.",
+        help=(
+            "Interval (in seconds) for each call to the periodic syncing "
+            "method. It is also the shortest interval used after a sync "
+            "finds changes."
+        ),
     ).tag(config=True)
 
-    kernel_record_class = Type(default_value=KernelRecord, klass=KernelRecord).tag(config=True)
+    syncing_max_interval = Float(
+        default_value=60.0,
+        help=(
+            "The longest interval (in seconds) between periodic syncs. The "
+            "interval grows by `syncing_backoff_factor` after each sync that "
+            "finds no changes, up to this value."
+        ),
+    ).tag(config=True)
+
+    syncing_backoff_factor = Float(
+        default_value=1.5,
+        min=1.0,
+        help="Factor by which the periodic syncing interval grows while nothing changes.",
+    ).tag(config=True)
+
+    syncing_jitter = Float(
+        default_value=0.1,
+        min=0.0,
+        max=1.0,
+        help=(
+            "Random spread of each periodic syncing interval, as a fraction "
+            "of the interval, so that servers started together do not sync "
+            "in lockstep."
+        ),
+    ).tag(config=True)
+
+    syncing_lag_threshold = Float(
+        default_value=1.0,
+        help=(
+            "Skip a periodic sync when the event loop is lagging by more than "
+            "this many seconds. Syncs are never skipped for longer than "
+            "`syncing_max_interval` in a row."
+        ),
+    ).tag(config=True)
+
+    sync_on_list_sessions = CaselessStrEnum(
+        ["blocking", "background", "off"],
+        default_value="blocking",
+        help=(
+            "How listing sessions synchronizes the server. 'blocking' waits "
+            "for a sync before listing; 'background' lists the last "
+            "synchronized state and starts a sync in the background; 'off' "
+            "never syncs when listing. Concurrent requests share one sync."
+        ),
+    ).tag(config=True)
+
+    sync_max_staleness = Float(
+        default_value=0.0,
+        help=(
+            "Listing sessions does not start a new sync if the last one "
+            "finished less than this many seconds ago."
+        ),
+    ).tag(config=True)
+
+    sync_on_events = Bool(
+        default_value=False,
+        help=(
+            "If True, regular syncing applies kernel and session changes "
+            "as they happen (from the server's kernel action events and "
+            "this session manager), and only runs a full sync every "
+            "`reconciliation_interval` seconds as a safety net."
+        ),
+    ).tag(config=True)
+
+    reconciliation_interval = Float(
+        default_value=60.0,
+        help="Interval (in seconds) between full syncs when `sync_on_events` is enabled.",
+    ).tag(config=True)
+
+    hydration_concurrency = Integer(
+        default_value=10,
+        min=1,
+        help="The maximum number of kernel managers hydrated concurrently.",
+    ).tag(config=True)
+
+    shutdown_concurrency = Integer(
+        default_value=10,
+        min=1,
+        help="The maximum number of kernels without sessions shut down concurrently.",
+    ).tag(config=True)
+
+    shutdown_timeout = Float(
+        default_value=30.0,
+        help="Time (in seconds) to wait for a kernel without a session to shut down.",
+    ).tag(config=True)
+
+    lease_duration = Float(
+        default_value=None,
+        allow_none=True,
+        help=(
+            "If set, several servers can share one `database_filepath`: "
+            "each server leases the kernels it records for this many "
+            "seconds, renews its leases while it syncs, and leaves kernels "
+            "leased by other servers alone. When a server stops renewing "
+            "its leases, the others take its kernels over. It must be "
+            "longer than the longest interval between syncs."
+        ),
+    ).tag(config=True)
+
+    server_instance_id = Unicode(
+        help=(
+            "The identifier of this server among the servers sharing a "
+            "kernel database, used as the owner of its leases. It must be "
+            "unique to each server process, and a server restarted with the "
+            "same identifier takes its kernels back at once. Defaults to the "
+            "host name and the process id."
+        ),
+    ).tag(config=True)
+
+    @default("server_instance_id")
+    def _default_server_instance_id(self) -> str:
+        return f"{socket.gethostname()}-{os.getpid()}"
 
-    _kernel_records = KernelRecordList()
+    kernel_record_class = Type(default_value=KernelRecord, klass=KernelRecord).tag(config=True)
 
     kernel_table_class = Type(default_value=KernelTable, klass=KernelTable)
     kernel_table = Instance(klass=KernelTable)
 
+    # Each kernel source sets one state flag on the records it reports;
+    # the `kernel_sources` set `alive`, like "running".
+    _source_flags: t.ClassVar[dict[str, str]] = {
+        "running": "alive",
+        "recorded": "recorded",
+        "managed": "managed",
+    }
+
     def __init__(self, *args: t.Any, **kwargs: t.Any) -> None:
         """Initialize the manager."""
         super().__init__(*args, **kwargs)
         self._pending_sessions = KernelSessionRecordList()
         self.kernel_table = self.kernel_table_class(
+            parent=self,
             database_filepath=self.database_filepath,
             kernel_record_class=self.kernel_record_class,
         )
+        # Database calls made while synchronizing run on this facade's
+        # thread instead of the event loop.
+        self.async_kernel_table = AsyncKernelTable(self.kernel_table)
+        # The merged state of all kernel sources, kept across syncs.
+        self._kernel_records = KernelRecordList()
+        # The last observation of each kernel source.
+        self._observed_records: dict[str, KernelRecordList] = {}
+        # The last result of `fetch_running_kernels` and of each of the
+        # `kernel_sources`.
+        self._last_fetched: dict[str, t.Any] = {}
+        # The rows of the kernel table by rowid, as of the change log
+        # version they were last read at.
+        self._recorded_rows: dict[int, KernelRecord] = {}
+        self._recorded_version: int | None = None
+        # Kernels leased by other servers, left out of the kernel sources,
+        # and the Unix time when the first of their leases expires.
+        self._foreign_kernel_ids: frozenset[str] = frozenset()
+        self._foreign_leases_expire = math.inf
+        # The foreign kernels that the kernel sources were last merged with.
+        self._merged_foreign_kernel_ids = self._foreign_kernel_ids
+        # Unix time when this server's leases are due for renewal.
+        self._lease_renewal_due = 0.0
+        # Kernels that no server recorded, by kernel_id, and the monotonic
+        # time they were first seen unrecorded.
+        self._unrecorded_since: dict[str, float] = {}
+        # Unsettled records that this server may not act upon, as leased by
+        # another server (or possibly so).
+        self._unclaimed_records: set[int] = set()
+        # Records that changed and may need to be hydrated, recorded or
+        # removed. Records whose action failed stay here to be retried.
+        self._unsettled_records: dict[int, KernelRecord] = {}
+        # Ensures that only one sync runs at a time.
+        self._sync_coordinator = SyncCoordinator(self._sync_managers, log=self.log)
+        # Kernel events are applied between syncs, never during one: the
+        # kernel records are only changed while holding this lock.
+        self._records_lock = locks.Lock()
+        # Kernel events of sessions, waiting for the lock in the background.
+        self._event_tasks: set[asyncio.Future[None]] = set()
+        # Monotonic time when the last sync finished.
+        self._last_synced: float | None = None
+        # The kernel source changes found by the last sync.
+        self._last_deltas: dict[str, KernelRecordDelta] = {}
+        self._last_sync_changes = 0
+        # Schedules periodic syncs once regular syncing has started.
+        self.sync_scheduler: SyncScheduler | None = None
 
     @default("kernel_table")
     def _default_kernel_remote_table(self) -> KernelTable:  # pragma: no cover
@@ -56,9 +310,13 @@ class SynchronizerSessionManager(SessionManager):  # type:ignore[misc]
 
     fetch_running_kernels = Awaitable(
         help=(
-            "The coroutine function used to fetch and record running kernels "
+            "The coroutine function used to fetch running kernels "
             "that might not be found/managed by Jupyter Server (i.e. they "
-            "are managed by a remote Kernel Gateway)."
+            "are managed by a remote Kernel Gateway). It is called with the "
+            "synchronizer and returns an iterable of alive kernel records. "
+            "Returning the same object as the previous call signals that "
+            "the running kernels have not changed. Merging records into the "
+            "synchronizer's `_kernel_records` instead is deprecated."
         )
     ).tag(config=True)
 
@@ -66,145 +324,700 @@ class SynchronizerSessionManager(SessionManager):  # type:ignore[misc]
     def _default_fetch_running_kernels(self) -> t.Callable[..., t.Any]:
         return fetch_gateway_kernels
 
-    def fetch_recorded_kernels(self) -> None:
-        """Fetch kernels stored in the local Kernel Database."""
-        for record in self.kernel_table.list():
-            record.recorded = True
-            self._kernel_records.update(record)
+    kernel_sources = Dict(
+        value_trait=Awaitable(),
+        default_value={},
+        help=(
+            "Additional sources of running kernels, as a mapping from a "
+            "source name to a coroutine function called like "
+            "`fetch_running_kernels`. All sources are fetched concurrently; "
+            "a kernel is alive while any of them reports it."
+        ),
+    ).tag(config=True)
+
+    gateway_urls = List(
+        Unicode(),
+        default_value=[],
+        help=(
+            "The base URLs of several Kernel/Enterprise Gateways whose "
+            "kernels are all synchronized. They are polled concurrently "
+            "by the default `fetch_running_kernels`, and their records are "
+            "tagged with the gateway URL as `origin`. A gateway that fails "
+            "keeps its last known kernels until it answers again. Only the "
+            "kernels of the kernel manager's own gateway (`GatewayClient.url`) "
+            "are hydrated; the others are only recorded. If empty, the kernel "
+            "manager's gateway is polled."
+        ),
+    ).tag(config=True)
 
-    def fetch_managed_kernels(self) -> None:
+    gateway_request_timeout = Float(
+        default_value=10.0,
+        allow_none=True,
+        help=(
+            "The time in seconds after which polling a gateway's kernels "
+            "is abandoned, if `gateway_urls` is set or `gateway_keep_alive` "
+            "is enabled. Each gateway is timed separately. Otherwise, the "
+            "Gateway client's `request_timeout` applies. If None, polls are "
+            "not timed out by the synchronizer."
+        ),
+    ).tag(config=True)
+
+    gateway_keep_alive = Bool(
+        default_value=False,
+        help=(
+            "Poll gateways over the synchronizer's own pool of keep-alive "
+            "connections, instead of through Jupyter Server's shared "
+            "Gateway client, which opens a new connection for each request. "
+            "The Gateway client's headers, authentication and TLS settings "
+            "are used either way, but redirects are not followed, and the "
+            "Gateway client's `connect_timeout` and `request_timeout` are "
+            "replaced by `gateway_connect_timeout` and `gateway_request_timeout`."
+        ),
+    ).tag(config=True)
+
+    gateway_max_connections = Integer(
+        default_value=2,
+        help=(
+            "The maximum number of keep-alive connections to each gateway, "
+            "if `gateway_keep_alive` is enabled."
+        ),
+    ).tag(config=True)
+
+    gateway_connect_timeout = Float(
+        default_value=5.0,
+        allow_none=True,
+        help=(
+            "The time in seconds after which connecting to a gateway is "
+            "abandoned, if `gateway_keep_alive` is enabled."
+        ),
+    ).tag(config=True)
+
+    @validate("kernel_sources")
+    def _validate_kernel_sources(self, proposal: dict[str, t.Any]) -> dict[str, t.Any]:
+        value: dict[str, t.Any] = proposal["value"]
+        reserved = set(self._source_flags).intersection(value)
+        if reserved:
+            msg = f"Kernel source names {sorted(reserved)} are reserved."
+            raise TraitError(msg)
+        return value
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """Start a database connection that can also be used from the
+        synchronizer's database thread.
+        """
+        if self._connection is None:
+            self._connection = sqlite3.connect(
+                self.database_filepath, isolation_level=None, check_same_thread=False
+            )
+            self._connection.row_factory = sqlite3.Row
+        return self._connection
+
+    def close(self) -> None:
+        """Close the sqlite connection, stop the database thread and
+        close the gateway connections.
+        """
+        super().close()
+        async_kernel_table = getattr(self, "async_kernel_table", None)
+        if async_kernel_table is not None:
+            async_kernel_table.close()
+        close_gateway_poller(self)
+
+    async def fetch_recorded_kernels(self) -> KernelRecordDelta:
+        """Fetch the changes to the kernels stored in the local Kernel
+        Database since the last call.
+
+        Only the rows changed since then are read, from the kernel
+        table's change log.
+        """
+        read = await self.async_kernel_table.run(self._read_recorded_kernels)
+        self._save_recorded_read(read)
+        return read.delta
+
+    def _read_recorded_kernels(self) -> RecordedKernelsRead:
+        table = self.kernel_table
+        lease_duration = self.lease_duration
+        if lease_duration is not None and time.time() >= self._lease_renewal_due:
+            self._renew_leases(lease_duration)
+        changes = table.changes_since(self._recorded_version)
+        rows = self._recorded_rows
+        updates = changes.records
+        if changes.reset:
+            # The rows that were not read again were deleted.
+            updates = {**dict.fromkeys(rows), **updates}
+        read = RecordedKernelsRead(KernelRecordDelta(), changes.version, updates)
+        foreign = previous_foreign = self._foreign_kernel_ids
+        if lease_duration is not None and (
+            # Leases can expire without any write to the database.
+            time.time() >= self._foreign_leases_expire
+            or any(
+                owner not in (None, self.server_instance_id) for owner in changes.owners.values()
+            )
+            or any(rows[row_id].kernel_id in foreign for row_id in updates if row_id in rows)
+        ):
+            read.foreign = self._find_foreign_kernels(table.leases())
+            if read.foreign[0] != previous_foreign:
+                foreign = read.foreign[0]
+        for row_id, record in updates.items():
+            self._diff_recorded_row(read.delta, rows.get(row_id), record, previous_foreign, foreign)
+        if foreign is not previous_foreign:
+            # Rows whose lease was taken or lost are added or removed.
+            toggled = foreign ^ previous_foreign
+            for row_id, record in rows.items():
+                if row_id not in updates and record.kernel_id in toggled:
+                    self._diff_recorded_row(read.delta, record, record, previous_foreign, foreign)
+        if changes.records:
+            table.compact_change_log()
+        return read
+
+    def _save_recorded_read(self, read: RecordedKernelsRead) -> None:
+        """Move to the state read from the kernel table, once its
+        changes are merged. Until then, the changes are read again.
+        """
+        self._recorded_version = read.version
+        rows = self._recorded_rows
+        for row_id, record in read.rows.items():
+            if record is None:
+                rows.pop(row_id, None)
+            else:
+                rows[row_id] = record
+        if read.foreign is not None:
+            foreign, self._foreign_leases_expire = read.foreign
+            if foreign != self._foreign_kernel_ids:
+                self._foreign_kernel_ids = foreign
+
+    def _diff_recorded_row(
+        self,
+        delta: KernelRecordDelta,
+        old: KernelRecord | None,
+        new: KernelRecord | None,
+        old_foreign: frozenset[str],
+        new_foreign: frozenset[str],
+    ) -> None:
+        """Add the change of one kernel table row to a delta. Kernels
+        leased by other servers are left out.
+        """
+        if old is not None and old.kernel_id in old_foreign:
+            old = None
+        if new is not None and new.kernel_id in new_foreign:
+            new = None
+        if old is None:
+            if new is not None:
+                delta.added.append(new)
+        elif new is None:
+            delta.removed.append(old)
+        elif old.get_identifier_values() != new.get_identifier_values():
+            delta.removed.append(old)
+            delta.added.append(new)
+        elif old.get_active_fields() != new.get_active_fields():
+            delta.changed.append(new)
+
+    def _renew_leases(self, lease_duration: float) -> None:
+        """Extend this server's leases, a third of a lease before they expire."""
+        now = time.time()
+        self.kernel_table.renew_leases(self.server_instance_id, now + lease_duration)
+        self._lease_renewal_due = now + lease_duration / 3
+
+    def _find_foreign_kernels(
+        self, leases: dict[str, tuple[str, float]]
+    ) -> tuple[frozenset[str], float]:
+        """Find the kernels leased by other servers, which are left out of
+        the kernel sources, and when the first of their leases expires.
+        """
+        now = time.time()
+        foreign = {
+            kernel_id: expires
+            for kernel_id, (owner, expires) in leases.items()
+            if owner != self.server_instance_id and expires > now
+        }
+        return frozenset(foreign), min(foreign.values(), default=math.inf)
+
+    def fetch_managed_kernels(self) -> KernelRecordList:
         """Fetch kernel records from any managed kernels (instances of
         KernelManagers) in the MultiKernelManager.
         """
-        for km in self.kernel_manager._kernels.values():
-            record = self.kernel_record_class.from_manager(km)
-            self._kernel_records.update(record)
+        return KernelRecordList(
+            *(
+                self.kernel_record_class.from_manager(km)
+                for km in self.kernel_manager._kernels.values()
+            )
+        )
 
-    async def fetch_kernel_records(self) -> None:
+    async def fetch_kernel_records(self) -> dict[str, KernelRecordDelta]:
         """Fetch all the information that can be found about
-        kernels started by this server.
+        kernels started by this server, and merge what changed
+        since the last sync into the kernel records.
+        """
+        running_sources = {"running": self.fetch_running_kernels, **self.kernel_sources}
+        fetches: dict[str, t.Callable[[], t.Awaitable[t.Any]]] = {
+            **{source: functools.partial(fetch, self) for source, fetch in running_sources.items()},
+            # The database is read on the database thread.
+            "recorded": functools.partial(self.async_kernel_table.run, self._read_recorded_kernels),
+            "managed": self._fetch_managed_kernels,
+        }
+        # Fetchers written before they returned records merged them into
+        # ``_kernel_records`` instead; collect what they merge.
+        records, legacy = self._kernel_records, KernelRecordList()
+        self._kernel_records = legacy
+        try:
+            # Wait for every source, so none is left running if one fails.
+            results: list[t.Any] = await asyncio.gather(
+                *(self._fetch_source(source, fetch) for source, fetch in fetches.items()),
+                return_exceptions=True,
+            )
+        finally:
+            self._kernel_records = records
+        for result in results:
+            if isinstance(result, BaseException):
+                # The kernel table's changes are read again next time.
+                raise result
+        if legacy:
+            warnings.warn(
+                "Kernel fetchers should return their kernel records instead of "
+                "merging them into the synchronizer's `_kernel_records`.",
+                DeprecationWarning,
+                stacklevel=2,
+            )
+            results = [
+                KernelRecordList(*legacy)
+                if source in running_sources and result is None
+                else result
+                for source, result in zip(fetches, results)
+            ]
+        for i, result in enumerate(results):
+            if isinstance(result, RecordedKernelsRead):
+                self._save_recorded_read(result)
+                results[i] = result.delta
+        foreign = self._foreign_kernel_ids
+        if foreign is not self._merged_foreign_kernel_ids:
+            # Running kernels leased by other servers changed, so every
+            # running source must be compared again.
+            self._last_fetched.clear()
+            self._merged_foreign_kernel_ids = foreign
+        # Merge in a fixed order, whichever source answered first.
+        deltas = {}
+        for source, result in zip(fetches, results):
+            if source in running_sources:
+                if result is not None and result is self._last_fetched.get(source):
+                    # The source returned its previous result, so nothing changed.
+                    deltas[source] = KernelRecordDelta()
+                    continue
+                self._last_fetched[source] = result
+                running = result or ()
+                if foreign:
+                    running = (r for r in running if r.kernel_id not in foreign)
+                observed = KernelRecordList(*running)
+            elif isinstance(result, KernelRecordDelta):
+                # The source only reported what changed.
+                deltas[source] = result
+                self._observed_records.setdefault(source, KernelRecordList())
+                if result:
+                    self._observe(source, result)
+                continue
+            else:
+                observed = result
+            previous = self._observed_records.get(source, KernelRecordList())
+            if observed is previous:
+                deltas[source] = KernelRecordDelta()
+                continue
+            deltas[source] = delta = observed.diff(previous)
+            self._apply_delta(source, delta)
+            self._observed_records[source] = observed
+        # The summary is only formatted if debug logging is enabled.
+        self.log.debug("Fetched kernel records: %s", SyncSummary(self, deltas))
+        return deltas
+
+    async def _fetch_source(self, source: str, fetch: t.Callable[[], t.Awaitable[t.Any]]) -> t.Any:
+        with observe_phase(f"fetch_{source}_kernels"):
+            return await fetch()
+
+    async def _fetch_managed_kernels(self) -> KernelRecordList:
+        return self.fetch_managed_kernels()
+
+    def _source_flag(self, source: str) -> str:
+        return self._source_flags.get(source, "alive")
+
+    def _observed_elsewhere(self, source: str, record: KernelRecord) -> bool:
+        """Whether another source that sets the same flag still reports a record."""
+        flag = self._source_flag(source)
+        return any(
+            record in observed
+            for other, observed in self._observed_records.items()
+            if other != source and self._source_flag(other) == flag
+        )
+
+    def _apply_delta(self, source: str, delta: KernelRecordDelta) -> None:
+        """Merge the changes seen in one kernel source into the kernel records."""
+        flag = self._source_flag(source)
+        for record in delta.added + delta.changed:
+            # Store a copy, so that the observation is not changed when
+            # the merged record is.
+            incoming = record.copy()
+            setattr(incoming, flag, True)
+            try:
+                self._kernel_records.update(incoming)
+                merged = self._kernel_records.get(incoming)
+            except KernelRecordConflict as e:
+                self.log.error("Could not merge kernel record: %s", record)
+                self.log.error(e)
+                SYNC_ERRORS_TOTAL.labels(phase=f"fetch_{source}_kernels").inc()
+                continue
+            self._unsettled_records[id(merged)] = merged
+        for record in delta.removed:
+            try:
+                existing = self._kernel_records.get(record)
+            except (ValueError, KernelRecordConflict):
+                continue
+            if self._observed_elsewhere(source, record):
+                continue
+            setattr(existing, flag, False)
+            if existing.alive or existing.recorded or existing.managed:
+                self._unsettled_records[id(existing)] = existing
+            else:
+                self._forget(existing)
+
+    def _forget(self, record: KernelRecord) -> None:
+        """Drop a record that no kernel source knows about anymore."""
+        self._kernel_records.remove(record)
+        self._unsettled_records.pop(id(record), None)
+
+    def _needs_action(self, kernel: KernelRecord) -> bool:
+        """Whether a record still needs to be removed, hydrated or recorded."""
+        if not kernel.alive:
+            return bool(kernel.recorded)
+        if not kernel.managed and self._can_hydrate(kernel):
+            return True
+        return not kernel.recorded and all(kernel.get_identifier_values())
+
+    def _can_hydrate(self, kernel: KernelRecord) -> bool:
+        """Whether the kernel manager can manage the kernel.
+
+        It can only reach kernels of its own gateway, so kernels polled
+        from the other `gateway_urls` are never hydrated.
         """
-        await self.fetch_running_kernels(self)
-        self.fetch_recorded_kernels()
-        self.fetch_managed_kernels()
-        # Log all kernel records seen at this stage
-        self.log.debug(str(self._kernel_records))
+        origin: str | None = getattr(kernel, "origin", None)
+        if not origin:
+            return True
+        url: str | None = GatewayClient.instance().url
+        if not url:
+            return False
+        return origin.rstrip("/") == url.rstrip("/")
 
-    def record_kernels(self) -> None:
+    def _actionable_records(self) -> list[KernelRecord]:
+        """The unsettled records that this server may act upon."""
+        if not self._unclaimed_records:
+            return list(self._unsettled_records.values())
+        return [
+            kernel
+            for key, kernel in self._unsettled_records.items()
+            if key not in self._unclaimed_records
+        ]
+
+    @instrument_phase("claim_kernels")
+    async def claim_kernels(self) -> None:
+        """Lease the kernels that this server is about to remove,
+        hydrate or record, if `lease_duration` is set.
+
+        Kernels that another server holds a lease on are left to it. A
+        running kernel that no server recorded yet may have just been
+        started by another server, so it is only taken over once it
+        stayed unrecorded for a whole lease.
+        """
+        self._unclaimed_records = set()
+        lease_duration = self.lease_duration
+        if lease_duration is None:
+            return
+        now = time.monotonic()
+        unrecorded_since = {}
+        candidates = []
+        for key, kernel in self._unsettled_records.items():
+            if not kernel.kernel_id or not self._needs_action(kernel):
+                continue
+            if kernel.alive and not kernel.recorded and not kernel.managed:
+                since = self._unrecorded_since.get(kernel.kernel_id, now)
+                if now - since < lease_duration:
+                    unrecorded_since[kernel.kernel_id] = since
+                    self._unclaimed_records.add(key)
+                    continue
+            candidates.append((key, kernel))
+        self._unrecorded_since = unrecorded_since
+        if not candidates:
+            return
+        wall_time = time.time()
+        claimed = await self.async_kernel_table.run(
+            self.kernel_table.claim_many,
+            [kernel for _, kernel in candidates],
+            self.server_instance_id,
+            wall_time + lease_duration,
+            wall_time,
+        )
+        for key, kernel in candidates:
+            if kernel.kernel_id not in claimed:
+                # The next sync finds it leased, and forgets it.
+                self.log.debug("Kernel %s is leased by another server.", kernel.kernel_id)
+                self._unclaimed_records.add(key)
+
+    @instrument_phase("record_kernels")
+    async def record_kernels(self) -> None:
         """Record the current kernels to the kernel database."""
-        for kernel in self._kernel_records._records:
-            conditions = [
-                # Kernel isn't already recorded
-                not kernel.recorded,
-                # Kernel has all identifiers
-                all(kernel.get_identifier_values()),
-                # Kernel is still running
-                kernel.alive,
-            ]
-            if all(conditions):
-                try:
-                    self.kernel_table.save(kernel)
-                    kernel.recorded = True
-                except Exception as e:
-                    self.log.error("Could not record kernel. %s", kernel)
-                    self.log.error(e)
-
-    def remove_stale_kernels(self) -> None:
+        # Running kernels that aren't recorded yet and have all identifiers.
+        kernels = [
+            kernel
+            for kernel in self._actionable_records()
+            if not kernel.recorded and all(kernel.get_identifier_values()) and kernel.alive
+        ]
+        if not kernels:
+            return
+        try:
+            await self.async_kernel_table.upsert_many(kernels)
+        except Exception as e:
+            self.log.error("Could not record kernels in a batch, retrying one by one. %s", e)
+            SYNC_ERRORS_TOTAL.labels(phase="record_kernels").inc()
+        else:
+            for kernel in kernels:
+                kernel.recorded = True
+            SYNC_KERNELS_TOTAL.labels(action="recorded").inc(len(kernels))
+            return
+        for kernel in kernels:
+            try:
+                await self.async_kernel_table.upsert(kernel)
+                kernel.recorded = True
+                SYNC_KERNELS_TOTAL.labels(action="recorded").inc()
+            except Exception as e:
+                self.log.error("Could not record kernel. %s", kernel)
+                self.log.error(e)
+                SYNC_ERRORS_TOTAL.labels(phase="record_kernels").inc()
+
+    @instrument_phase("remove_stale_kernels")
+    async def remove_stale_kernels(self) -> None:
         """Remove kernels from the database that are no longer running."""
-        for k in self._kernel_records._records:
-            if not k.alive:
-                try:
-                    self._kernel_records.remove(k)
-                    if k.recorded:
-                        self.kernel_table.delete(kernel_id=k.kernel_id)
-                except Exception as e:
-                    self.log.error("Could not remove kernel from records: %s", k)
-                    self.log.error(e)
+        stale = [k for k in self._actionable_records() if not k.alive]
+        recorded = [k for k in stale if k.recorded]
+        if recorded:
+            try:
+                await self.async_kernel_table.delete_many(recorded)
+            except Exception as e:
+                self.log.error("Could not remove kernels in a batch, retrying one by one. %s", e)
+                SYNC_ERRORS_TOTAL.labels(phase="remove_stale_kernels").inc()
+                for k in recorded:
+                    try:
+                        await self.async_kernel_table.delete(kernel_id=k.kernel_id)
+                    except Exception as err:
+                        self.log.error("Could not remove kernel from records: %s", k)
+                        self.log.error(err)
+                        SYNC_ERRORS_TOTAL.labels(phase="remove_stale_kernels").inc()
+                        # Keep the kernel, so that removing it is retried.
+                        stale.remove(k)
+            SYNC_KERNELS_TOTAL.labels(action="removed").inc(sum(1 for k in stale if k.recorded))
+        for k in stale:
+            k.recorded = False
+            if not k.managed:
+                self._forget(k)
 
+    @instrument_phase("hydrate_kernel_managers")
     async def hydrate_kernel_managers(self) -> None:
         """Create KernelManagers for kernels found for this
         server but are not yet managed.
+
+        Up to `hydration_concurrency` kernels are hydrated at a time.
         """
-        for k in self._kernel_records._records:
-            if not k.managed and k.alive:
-                if not k.kernel_id:
-                    kernel_id = str(uuid.uuid4())
-                    k.kernel_id = kernel_id
-                kwargs = k.get_active_fields()
-                try:
-                    await self.kernel_manager.start_kernel(**kwargs)
-                    k.managed = True
-                except Exception as e:
-                    self.log.error("Could not hydrate a manager for kernel: %s", k)
-                    self.log.error(e)
+        kernels = []
+        for k in self._actionable_records():
+            if k.managed or not k.alive:
+                continue
+            if self._can_hydrate(k):
+                kernels.append(k)
+            else:
+                self.log.warning(
+                    "Not hydrating kernel %s: it runs on the gateway at %s, "
+                    "but the kernel manager only reaches its own gateway.",
+                    k.kernel_id,
+                    k.origin,
+                )
+        if not kernels:
+            return
+        for k in kernels:
+            if not k.kernel_id:
+                kernel_id = str(uuid.uuid4())
+                k.kernel_id = kernel_id
+                self._kernel_records.reindex(k)
+        semaphore = asyncio.Semaphore(self.hydration_concurrency)
+        started = time.monotonic()
+        results = await asyncio.gather(*(self._hydrate_kernel(k, semaphore) for k in kernels))
+        self.log.info(
+            "Hydrated %d of %d kernels in %.3f seconds.",
+            sum(results),
+            len(kernels),
+            time.monotonic() - started,
+        )
+
+    async def _hydrate_kernel(self, k: KernelRecord, semaphore: asyncio.Semaphore) -> bool:
+        """Hydrate a manager for one kernel; return whether it succeeded."""
+        async with semaphore:
+            started = time.monotonic()
+            kwargs = k.get_active_fields()
+            try:
+                await self.kernel_manager.start_kernel(**kwargs)
+            except Exception as e:
+                self.log.error("Could not hydrate a manager for kernel: %s", k)
+                self.log.error(e)
+                SYNC_ERRORS_TOTAL.labels(phase="hydrate_kernel_managers").inc()
+                return False
+            k.managed = True
+            SYNC_KERNELS_TOTAL.labels(action="hydrated").inc()
+            self.log.debug(
+                "Hydrated a manager for kernel %s in %.3f seconds.",
+                k.kernel_id,
+                time.monotonic() - started,
+            )
+            return True
+
+    def _settle_kernels(self) -> None:
+        """Stop tracking records that need no further action."""
+        for key, kernel in list(self._unsettled_records.items()):
+            if not self._needs_action(kernel):
+                del self._unsettled_records[key]
 
+    @instrument_phase("delete_stale_sessions")
     async def delete_stale_sessions(self) -> None:
         """Delete sessions that either have no kernel or no content
         found in the server.
         """
-        session_rows = self.cursor.execute("SELECT * FROM session")
+        session_kids = await self.async_kernel_table.run(self._fetch_session_kernel_ids)
+        # Decide what is stale against the kernels as they are now, after
+        # the read: a kernel started meanwhile is never mistaken for stale.
         mkm = self.kernel_manager
-        # We need to use fetchall() here, because we delete rows,
-        # which messes up the cursor if we're iterating over rows.
-        for session in session_rows.fetchall():
-            kid = session["kernel_id"]
-            known_kids = list(mkm._kernels.keys()) + list(mkm._pending_kernels.keys())
-            if kid not in known_kids:
-                self.log.debug(
-                    "Kernel %s found in the session_manager but "
-                    "not in the kernel_manager. Deleting this session.",
-                    kid,
-                )
-                # session = await self.get_session(kernel_id=kid)
-                self.cursor.execute("DELETE FROM session WHERE kernel_id=?", (kid,))
-            # TODO: There is an issue with the logic below. It isn't necessarily
-            # guaranteed that the document listed in a session has been saved
-            # to disk. In particular, creating a new document in JLab causes
-            # issues for this logic. The session is created/saved before the
-            # new document is saved. The logic below doesn't *see* the document
-            # and subsequently deletes the session. There is no way (today) to
-            # get a "pending" content.
-            # # Check the contents manager for documents.
-            # file_exists = self.contents_manager.exists(path=session["path"])
-            # if not file_exists:
-            #     session_id = session["session_id"]
-            #     self.log.debug(
-            #         f"The document path for {session_id} was not found. Deleting this session."
-            #     )
-            #     await self.delete_session(session_id)
+        known_kids = set(mkm._kernels) | set(mkm._pending_kernels)
+        if self.lease_duration is not None:
+            # Sessions may belong to other servers sharing the database:
+            # keep those of their kernels, and of any running kernel.
+            known_kids |= self._foreign_kernel_ids
+            known_kids.update(k.kernel_id for k in self._kernel_records if k.alive and k.kernel_id)
+        stale_kids = [kid for kid in session_kids if kid not in known_kids]
+        if stale_kids:
+            await self.async_kernel_table.run(self._delete_sessions_of_kernels, stale_kids)
+            self.log.debug(
+                "Kernels %s found in the session_manager but "
+                "not in the kernel_manager. Deleted their sessions.",
+                stale_kids,
+            )
+        # TODO: There is an issue with the logic below. It isn't necessarily
+        # guaranteed that the document listed in a session has been saved
+        # to disk. In particular, creating a new document in JLab causes
+        # issues for this logic. The session is created/saved before the
+        # new document is saved. The logic below doesn't *see* the document
+        # and subsequently deletes the session. There is no way (today) to
+        # get a "pending" content.
+        # # Check the contents manager for documents.
+        # file_exists = self.contents_manager.exists(path=session["path"])
+        # if not file_exists:
+        #     session_id = session["session_id"]
+        #     self.log.debug(
+        #         f"The document path for {session_id} was not found. Deleting this session."
+        #     )
+        #     await self.delete_session(session_id)
+
+    def _delete_sessions_of_kernels(self, kernel_ids: list[str | None]) -> None:
+        """Delete, in one statement, the sessions of the given kernels
+        (`None` for sessions without a kernel).
+        """
+        # Create the session table, if needed.
+        _ = self.cursor
+        # A new cursor, so the shared one is not used from two threads.
+        cursor = self.connection.cursor()
+        stale = "kernel_id IN (SELECT kernel_id FROM temp.stale_kernels)"
+        if None in kernel_ids:
+            stale += " OR kernel_id IS NULL"
+        cursor.execute("BEGIN")
+        try:
+            cursor.execute("CREATE TEMP TABLE IF NOT EXISTS stale_kernels (kernel_id PRIMARY KEY)")
+            cursor.execute("DELETE FROM temp.stale_kernels")
+            cursor.executemany(
+                "INSERT OR IGNORE INTO temp.stale_kernels VALUES (?)",
+                ((k,) for k in kernel_ids if k is not None),
+            )
+            cursor.execute(f"DELETE FROM session WHERE {stale}")  # noqa: S608
+            cursor.execute("DELETE FROM temp.stale_kernels")
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+        cursor.execute("COMMIT")
+
+    def _fetch_session_kernel_ids(self) -> set[str | None]:
+        rows = self._query_sessions("SELECT kernel_id FROM session")
+        return {row["kernel_id"] for row in rows}
 
+    @instrument_phase("shutdown_kernels_without_sessions")
     async def shutdown_kernels_without_sessions(self) -> None:
         """Shutdown 'unknown' kernels (found in kernelmanager but
         not the session manager).
+
+        Up to `shutdown_concurrency` kernels are shut down at a time.
         """
+        session_kernel_ids = await self.async_kernel_table.run(self._fetch_session_kernel_ids)
+        orphans = []
         for kernel_id in self.kernel_manager.list_kernel_ids():
+            if kernel_id in session_kernel_ids or kernel_id in self._pending_sessions:
+                continue
+            if kernel_id in self._foreign_kernel_ids:
+                # Leased by another server, whose sessions are its own.
+                continue
             try:
-                kernel = await self.get_session(kernel_id=kernel_id)
-            except Exception:
-                try:
-                    kernel = self.kernel_manager.get_kernel(kernel_id)
-                    if not kernel.ready.done() or kernel_id in self._pending_sessions:
-                        continue
-                    self.log.debug(
-                        "Kernel %s found in the kernel_manager is not "
-                        "found in the session database. Shutting down the kernel.",
-                        kernel_id,
-                    )
-                    await self.kernel_manager.shutdown_kernel(kernel_id)
-                # Log any failures, but don't raise exceptions.
-                except Exception as err2:
-                    self.log.info(err2)
+                kernel = self.kernel_manager.get_kernel(kernel_id)
+                if not kernel.ready.done():
+                    continue
+            # Log any failures, but don't raise exceptions.
+            except Exception as err:
+                self.log.info(err)
+                continue
+            orphans.append(kernel_id)
+        if not orphans:
+            return
+        semaphore = asyncio.Semaphore(self.shutdown_concurrency)
+        await asyncio.gather(*(self._shutdown_orphan(kid, semaphore) for kid in orphans))
+
+    async def _shutdown_orphan(self, kernel_id: str, semaphore: asyncio.Semaphore) -> None:
+        async with semaphore:
+            self.log.debug(
+                "Kernel %s found in the kernel_manager is not "
+                "found in the session database. Shutting down the kernel.",
+                kernel_id,
+            )
+            try:
+                await asyncio.wait_for(
+                    self.kernel_manager.shutdown_kernel(kernel_id), self.shutdown_timeout
+                )
+            except asyncio.TimeoutError:
+                self.log.warning(
+                    "Shutting down kernel %s timed out after %s seconds.",
+                    kernel_id,
+                    self.shutdown_timeout,
+                )
+                SYNC_ERRORS_TOTAL.labels(phase="shutdown_kernels_without_sessions").inc()
+            # Log any failures, but don't raise exceptions.
+            except Exception as err:
+                self.log.info(err)
+                SYNC_ERRORS_TOTAL.labels(phase="shutdown_kernels_without_sessions").inc()
+            else:
+                SYNC_KERNELS_TOTAL.labels(action="shutdown").inc()
 
     async def sync_kernels(self) -> None:
         """Synchronize the kernel manager, kernel database, and
         remote kernel service.
-        """
-        self._kernel_records = KernelRecordList()
-        await self.fetch_kernel_records()
 
-        self.remove_stale_kernels()
-        await self.hydrate_kernel_managers()
-        self.record_kernels()
+        The kernel records persist across syncs. Each kernel source is
+        compared against its previous observation and only the changes
+        are applied to the kernel database and kernel manager.
+        """
+        async with self._records_lock:
+            self._last_deltas = await self.fetch_kernel_records()
+            # Only records that changed since the last sync (or whose
+            # last action failed) are acted upon.
+            await self.claim_kernels()
+            await self.remove_stale_kernels()
+            await self.hydrate_kernel_managers()
+            await self.record_kernels()
+            self._settle_kernels()
 
     async def sync_sessions(self) -> None:
         """Synchronize the session database and with the
@@ -223,35 +1036,337 @@ class SynchronizerSessionManager(SessionManager):  # type:ignore[misc]
     async def sync_managers(self) -> None:
         """Rehydrate sessions and kernels managers from the remote
         kernel service.
+
+        Only one sync runs at a time. If a sync is already running,
+        this waits for a single follow-up sync shared with any other
+        caller that arrives in the meantime.
         """
+        await self._sync_coordinator.request()
+
+    async def _sync_managers(self) -> None:
         self.log.debug("Synchronizing kernel records.")
         await self.sync_kernels()
+        self._last_sync_changes = sum(
+            len(d.added) + len(d.removed) + len(d.changed) for d in self._last_deltas.values()
+        )
         self.log.debug("Synchronizing kernel sessions.")
         await self.sync_sessions()
+        self._last_synced = time.monotonic()
+
+    def _is_stale(self) -> bool:
+        """Whether the last sync is older than `sync_max_staleness`."""
+        if self._last_synced is None:
+            return True
+        return time.monotonic() - self._last_synced >= self.sync_max_staleness
 
     async def list_sessions(self) -> list[dict[str, t.Any]]:
         """List the sessions."""
         # Run the synchronizer loop
+        if self.sync_on_list_sessions != "off" and self._is_stale():
+            # Any sync in flight is recent enough for listing sessions.
+            sync = self._sync_coordinator.request(fresh=False)
+            if self.sync_on_list_sessions == "blocking":
+                # Failures are logged by the sync coordinator.
+                with contextlib.suppress(Exception):
+                    await sync
+        rows = await self._run_session_query("SELECT * FROM session")
+        result: list[dict[str, t.Any]] = []
+        for row in rows:
+            # Sessions whose kernel is gone are deleted and left out.
+            with contextlib.suppress(KeyError):
+                result.append(t.cast(t.Dict[str, t.Any], await self.row_to_model(row)))
+        return result
+
+    def diagnostics(self) -> dict[str, t.Any]:
+        """A full dump of the synchronizer's state, for debugging."""
+        scheduler = self.sync_scheduler
+        last_synced = self._last_synced
+        return {
+            "seconds_since_last_sync": (
+                None if last_synced is None else time.monotonic() - last_synced
+            ),
+            "sync": {
+                "running": self._sync_coordinator.running,
+                "runs": self._sync_coordinator.runs,
+                "coalesced": self._sync_coordinator.coalesced,
+            },
+            "scheduler": None if scheduler is None else scheduler.stats(),
+            "observed": {
+                source: len(observed) for source, observed in self._observed_records.items()
+            },
+            "records": [dataclasses.asdict(r) for r in self._kernel_records],
+            "unsettled": [r.kernel_id for r in self._unsettled_records.values()],
+            "leases": None
+            if self.lease_duration is None
+            else {
+                "server_instance_id": self.server_instance_id,
+                "foreign": len(self._foreign_kernel_ids),
+                "awaiting_adoption": sorted(self._unrecorded_since),
+            },
+        }
+
+    def subscribe_to_events(self) -> bool:
+        """Listen to the kernel action events of the server's event logger.
+        Returns False if the server does not emit events.
+        """
+        event_logger = getattr(self.parent, "event_logger", None)
+        if event_logger is None:
+            return False
+        from jupyter_events.schema_registry import SchemaRegistryException
+        from jupyter_server import DEFAULT_EVENTS_SCHEMA_PATH
+
+        with contextlib.suppress(SchemaRegistryException):
+            event_logger.register_event_schema(
+                DEFAULT_EVENTS_SCHEMA_PATH / "kernel_actions" / "v1.yaml"
+            )
+        event_logger.add_listener(
+            modified=False, schema_id=KERNEL_ACTIONS_SCHEMA_ID, listener=self._on_kernel_action
+        )
+        return True
+
+    async def _on_kernel_action(self, *, data: dict[str, t.Any], **_kwargs: t.Any) -> None:
+        # The event logger also passes itself and the schema id.
+        await self.apply_kernel_event(data)
+
+    async def apply_kernel_event(self, event: dict[str, t.Any]) -> None:
+        """Apply a kernel action event (as described by Jupyter Server's
+        `kernel_actions` event schema) to the kernel records right away.
+
+        Any other source of kernel events, like a remote kernel service's
+        event stream, can push its events here too.
+        """
+        kernel_id = event.get("kernel_id")
+        if event.get("status") != "success" or not kernel_id:
+            return
+        action = event.get("action")
+        if action in ("start", "restart"):
+            await self.kernel_started(kernel_id, event.get("kernel_name"))
+        elif action == "shutdown":
+            await self.kernel_shutdown(kernel_id)
+
+    async def kernel_started(self, kernel_id: str, kernel_name: str | None = None) -> None:
+        """Record a kernel that was just started by this server."""
+        record = self.kernel_record_class(kernel_id=kernel_id, kernel_name=kernel_name)
+        # The kernel was started through the kernel manager, so it is
+        # both running and managed. The event counts as an observation of
+        # both sources; a full sync diffs against it like any other.
+        async with self._records_lock:
+            for source in ("running", "managed"):
+                self._observe(source, KernelRecordDelta(added=[record]))
+            await self.claim_kernels()
+            await self.record_kernels()
+            self._settle_kernels()
+
+    async def kernel_shutdown(self, kernel_id: str) -> None:
+        """Forget a kernel that was just shut down by this server."""
+        record = self.kernel_record_class(kernel_id=kernel_id)
+        async with self._records_lock:
+            for source in ("running", "managed"):
+                self._observe(source, KernelRecordDelta(removed=[record]))
+            await self.claim_kernels()
+            await self.remove_stale_kernels()
+            self._settle_kernels()
+        await self._run_session_query("DELETE FROM session WHERE kernel_id=?", (kernel_id,))
+
+    def _observe(self, source: str, delta: KernelRecordDelta) -> None:
+        """Apply a change pushed by a kernel source, and add it to the
+        source's last observation.
+        """
+        # The next fetch must be diffed, even if it is unchanged.
+        self._last_fetched.pop(source, None)
+        observed = self._observed_records.setdefault(source, KernelRecordList())
+        for record in delta.added:
+            try:
+                observed.update(record.copy())
+            except KernelRecordConflict as e:
+                self.log.error(e)
+        for record in delta.removed:
+            observed.remove(record)
+        for record in delta.changed:
+            observed.remove(record)
+            observed.update(record.copy())
+        self._apply_delta(source, delta)
+
+    def _apply_in_background(self, event: t.Awaitable[None]) -> None:
+        """Apply a kernel event without waiting for any sync in flight.
+
+        Events are applied in the order they were queued.
+        """
+        task = asyncio.ensure_future(event)
+        self._event_tasks.add(task)
+        task.add_done_callback(self._event_applied)
+
+    def _event_applied(self, task: asyncio.Future[None]) -> None:
+        self._event_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self.log.error("Could not apply a kernel event: %s", task.exception())
+
+    async def create_session(self, *args: t.Any, **kwargs: t.Any) -> dict[str, t.Any]:
+        """Create a session and, if `sync_on_events` is enabled, record its
+        kernel in the background.
+        """
+        session = await super().create_session(*args, **kwargs)
+        if self.sync_on_events:
+            kernel = session["kernel"]
+            self._apply_in_background(self.kernel_started(kernel["id"], kernel["name"]))
+        return session
+
+    async def delete_session(self, session_id: str) -> None:
+        """Delete a session and, if `sync_on_events` is enabled, forget its
+        kernel in the background.
+        """
+        record = KernelSessionRecord(session_id=session_id)
+        self._pending_sessions.update(record)
+        session = await self.get_session(session_id=session_id)
+        await ensure_async(self.kernel_manager.shutdown_kernel(session["kernel"]["id"]))
+        await self._run_session_query("DELETE FROM session WHERE session_id=?", (session_id,))
+        self._pending_sessions.remove(record)
+        if self.sync_on_events:
+            self._apply_in_background(self.kernel_shutdown(session["kernel"]["id"]))
+
+    # The session table is shared with the database thread, so every query
+    # on it runs there, one at a time, like those of the synchronizer.
+
+    async def _run_session_query(
+        self, query: str, params: t.Sequence[t.Any] = ()
+    ) -> list[sqlite3.Row]:
+        """Run a query on the session table, on the database thread."""
+        return await self.async_kernel_table.run(self._query_sessions, query, params)
+
+    def _query_sessions(self, query: str, params: t.Sequence[t.Any] = ()) -> list[sqlite3.Row]:
+        # Create the session table, if needed.
+        _ = self.cursor
+        return self.connection.execute(query, params).fetchall()
+
+    async def session_exists(self, path: str) -> bool:
+        """Check to see if the session of a given name exists"""
+        rows = await self._run_session_query("SELECT * FROM session WHERE path=?", (path,))
+        if not rows:
+            return False
+        # The session is deleted if its kernel is gone.
+        return await self.row_to_model(rows[0], tolerate_culled=True) is not None
+
+    async def save_session(
+        self,
+        session_id: str,
+        path: str | None = None,
+        name: str | None = None,
+        type: str | None = None,
+        kernel_id: str | None = None,
+    ) -> dict[str, t.Any]:
+        """Save the items for the session with the given session_id."""
+        await self._run_session_query(
+            "INSERT INTO session VALUES (?,?,?,?,?)", (session_id, path, name, type, kernel_id)
+        )
+        return await self.get_session(session_id=session_id)
+
+    async def get_session(self, **kwargs: t.Any) -> dict[str, t.Any]:
+        """Return the model of the session with the given column values."""
+        if not kwargs:
+            msg = "must specify a column to query"
+            raise TypeError(msg)
+        for column in kwargs:
+            if column not in self._columns:
+                msg = f"No such column: {column}"
+                raise TypeError(msg)
+        conditions = " AND ".join(f"{column}=?" for column in kwargs)
+        rows = await self._run_session_query(
+            f"SELECT * FROM session WHERE {conditions}",  # noqa: S608
+            list(kwargs.values()),
+        )
+        if not rows:
+            q = ", ".join(f"{key}={value!r}" for key, value in kwargs.items())
+            raise web.HTTPError(404, f"Session not found: {q}")
         try:
-            await self.sync_managers()
-        except Exception as e:
-            self.log.error(e)
-        out = await super().list_sessions()
-        return t.cast(t.List[t.Dict[str, t.Any]], out)
+            model = await self.row_to_model(rows[0])
+        except KeyError as e:
+            raise web.HTTPError(404, f"Session not found: {e}") from e
+        return t.cast(t.Dict[str, t.Any], model)
+
+    async def update_session(self, session_id: str, **kwargs: t.Any) -> None:
+        """Update the values of the session with the given session_id."""
+        await self.get_session(session_id=session_id)
+        if not kwargs:
+            return
+        for column in kwargs:
+            if column not in self._columns:
+                msg = f"No such column: {column!r}"
+                raise TypeError(msg)
+        sets = ", ".join(f"{column}=?" for column in kwargs)
+        await self._run_session_query(
+            f"UPDATE session SET {sets} WHERE session_id=?",  # noqa: S608
+            [*kwargs.values(), session_id],
+        )
+        if hasattr(self.kernel_manager, "update_env"):
+            rows = await self._run_session_query(
+                "SELECT path, name, kernel_id FROM session WHERE session_id=?", (session_id,)
+            )
+            path, name, kernel_id = rows[0]
+            self.kernel_manager.update_env(kernel_id=kernel_id, env=self.get_kernel_env(path, name))
+
+    async def row_to_model(
+        self, row: sqlite3.Row, tolerate_culled: bool = False
+    ) -> dict[str, t.Any] | None:
+        """Turn a session row into a model. The session is deleted if its
+        kernel is gone.
+        """
+        if await self.kernel_culled(row["kernel_id"]):
+            await self._run_session_query(
+                "DELETE FROM session WHERE session_id=?", (row["session_id"],)
+            )
+            msg = (
+                f"Kernel '{row['kernel_id']}' appears to have been culled or died "
+                f"unexpectedly, invalidating session '{row['session_id']}'. "
+                "The session has been removed."
+            )
+            if tolerate_culled:
+                self.log.warning("%s  Continuing...", msg)
+                return None
+            raise KeyError(msg)
+        kernel_model = await ensure_async(self.kernel_manager.kernel_model(row["kernel_id"]))
+        model = {
+            "id": row["session_id"],
+            "path": row["path"],
+            "name": row["name"],
+            "type": row["type"],
+            "kernel": kernel_model,
+        }
+        if row["type"] == "notebook":
+            # Provide the deprecated API.
+            model["notebook"] = {"path": row["path"], "name": row["name"]}
+        return model
 
     async def _regular_syncing(self, interval: float = 5.0) -> None:
-        """Start regular syncing on a defined interval."""
-        while True:
-            self.log.info("Synchronizer is starting another loop.")
-            # Try to synchronizer. If failed, log the exception.
-            try:
-                await self.sync_managers()
-            except Exception as err:
-                self.log.error("Synchronizer failed: %s", err)
-                if self.log.isEnabledFor(10):
-                    self.log.exception(err)
-            await asyncio.sleep(interval)
+        """Start regular syncing on an adaptive interval, starting at
+        `interval` seconds.
+        """
+        self.sync_scheduler = SyncScheduler(
+            self._sync_tick,
+            min_interval=interval,
+            max_interval=max(interval, self.syncing_max_interval),
+            backoff_factor=self.syncing_backoff_factor,
+            jitter=self.syncing_jitter,
+            lag_threshold=self.syncing_lag_threshold,
+            log=self.log,
+        )
+        await self.sync_scheduler.run()
+
+    async def _sync_tick(self) -> bool:
+        """Run one periodic sync; return whether it found changes."""
+        self.log.info("Synchronizer is starting another loop.")
+        # Failures are logged by the sync coordinator and the scheduler.
+        await self.sync_managers()
+        return self._last_sync_changes > 0
 
     def start_regular_syncing(self) -> asyncio.Future[t.Any]:
-        """Run regular syncing in a background task."""
-        return asyncio.ensure_future(self._regular_syncing(interval=self.syncing_interval))
+        """Run regular syncing in a background task.
+
+        If `sync_on_events` is enabled, changes are applied as events
+        arrive, and full syncs run every `reconciliation_interval` seconds.
+        """
+        interval = self.syncing_interval
+        if self.sync_on_events:
+            if not self.subscribe_to_events():
+                self.log.info("The server does not emit kernel events; only sessions are tracked.")
+            interval = self.reconciliation_interval
+        return asyncio.ensure_future(self._regular_syncing(interval=interval))
@@ -0,0 +1,64 @@
+"""
+Prometheus metrics exported by the synchronizer.
+
+They are registered in the default registry, so they are served by
+Jupyter Server's `/metrics` endpoint.
+
+Read https://prometheus.io/docs/practices/naming/ for naming
+conventions for metrics & labels.
+"""
+from __future__ import annotations
+
+import contextlib
+import functools
+import time
+from typing import Any, Awaitable, Callable, Iterator, TypeVar
+
+from prometheus_client import Counter, Histogram
+
+SYNC_PHASE_DURATION_SECONDS = Histogram(
+    "jupyter_server_synchronizer_phase_duration_seconds",
+    "duration in seconds of each phase of a synchronization",
+    ["phase"],
+)
+
+SYNC_KERNELS_TOTAL = Counter(
+    "jupyter_server_synchronizer_kernels_total",
+    "counter for kernels hydrated, recorded, removed or shut down by the synchronizer",
+    ["action"],
+)
+
+SYNC_ERRORS_TOTAL = Counter(
+    "jupyter_server_synchronizer_errors_total",
+    "counter for errors in each phase of a synchronization",
+    ["phase"],
+)
+
+_F = TypeVar("_F", bound=Callable[..., Awaitable[Any]])
+
+
+@contextlib.contextmanager
+def observe_phase(phase: str) -> Iterator[None]:
+    """Time a synchronization phase, and count the errors it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        SYNC_ERRORS_TOTAL.labels(phase=phase).inc()
+        raise
+    finally:
+        SYNC_PHASE_DURATION_SECONDS.labels(phase=phase).observe(time.perf_counter() - start)
+
+
+def instrument_phase(phase: str) -> Callable[[_F], _F]:
+    """Decorate a coroutine function to observe it as a synchronization phase."""
+
+    def decorator(func: _F) -> _F:
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with observe_phase(phase):
+                return await func(*args, **kwargs)
+
+        return wrapper  # type:ignore[return-value]
+
+    return decorator
@@ -0,0 +1,130 @@
+"""Schedule regular synchronizations."""
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+from typing import Any, Awaitable, Callable
+
+
+class SyncScheduler:
+    """Runs a tick function on an adaptive, jittered interval.
+
+    The interval grows by `backoff_factor` after each tick that found no
+    changes, up to `max_interval`, and drops back to `min_interval` as
+    soon as a tick finds changes. Each delay is randomly spread by
+    `jitter` (a fraction of the interval), so that servers started
+    together do not poll in lockstep. When the event loop is lagging by
+    more than `lag_threshold` seconds, the tick is skipped, but ticks are
+    never skipped for more than `max_interval` seconds in a row.
+    """
+
+    def __init__(
+        self,
+        tick: Callable[[], Awaitable[bool]],
+        min_interval: float,
+        max_interval: float | None = None,
+        backoff_factor: float = 1.5,
+        jitter: float = 0.1,
+        lag_threshold: float = 1.0,
+        log: logging.Logger | None = None,
+        rng: random.Random | None = None,
+    ) -> None:
+        """Initialize the scheduler.
+
+        `tick` returns whether it found any changes.
+        """
+        self._tick = tick
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval or min_interval)
+        self.backoff_factor = backoff_factor
+        self.jitter = jitter
+        self.lag_threshold = lag_threshold
+        self.log = log or logging.getLogger(__name__)
+        self._random = rng or _random
+        #: The interval (in seconds) before the next tick, before jitter.
+        self.interval = min_interval
+        #: Number of ticks run.
+        self.ticks = 0
+        #: Number of ticks that found changes.
+        self.changed_ticks = 0
+        #: Number of ticks that failed.
+        self.failed_ticks = 0
+        #: Number of ticks skipped because the event loop was lagging.
+        self.skipped_ticks = 0
+        #: How late (in seconds) the event loop woke up for the last tick.
+        self.last_lag = 0.0
+
+    def next_delay(self) -> float:
+        """The delay before the next tick: the interval, randomly spread by `jitter`."""
+        spread = self.interval * self.jitter
+        return max(0.0, self.interval + self._random.uniform(-spread, spread))
+
+    def record(self, changed: bool) -> None:
+        """Adapt the interval to the outcome of a tick."""
+        if changed:
+            self.changed_ticks += 1
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.max_interval, self.interval * self.backoff_factor)
+
+    def stats(self) -> dict[str, Any]:
+        """The current interval and tick statistics."""
+        return {
+            "interval": self.interval,
+            "ticks": self.ticks,
+            "changed_ticks": self.changed_ticks,
+            "failed_ticks": self.failed_ticks,
+            "skipped_ticks": self.skipped_ticks,
+            "last_lag": self.last_lag,
+        }
+
+    async def tick(self) -> None:
+        """Run the tick function once and adapt the interval."""
+        self.ticks += 1
+        try:
+            changed = await self._tick()
+        except Exception as err:
+            # Keep the interval; the failure is not a sign of (no) churn.
+            self.failed_ticks += 1
+            self.log.debug("Scheduled tick failed: %s", err, exc_info=err)
+            return
+        self.record(changed)
+
+    async def sleep(self, delay: float) -> bool:
+        """Sleep for `delay` seconds; return False if the event loop
+        woke up more than `lag_threshold` seconds late.
+        """
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await asyncio.sleep(delay)
+        self.last_lag = max(0.0, loop.time() - start - delay)
+        return self.last_lag <= self.lag_threshold
+
+    async def run(self) -> None:
+        """Run ticks forever, starting after a random fraction of the
+        jitter, so that schedulers started together spread out.
+        """
+        loop = asyncio.get_running_loop()
+        await asyncio.sleep(self._random.uniform(0, self.interval * self.jitter))
+        while True:
+            await self.tick()
+            skipping_since: float | None = None
+            while not await self.sleep(self.next_delay()):
+                now = loop.time()
+                if skipping_since is None:
+                    skipping_since = now
+                elif now - skipping_since >= self.max_interval:
+                    self.log.debug(
+                        "Running a scheduled tick although the event loop is %.3f seconds behind.",
+                        self.last_lag,
+                    )
+                    break
+                self.skipped_ticks += 1
+                self.log.debug(
+                    "Skipped a scheduled tick; the event loop is %.3f seconds behind.",
+                    self.last_lag,
+                )
+
+
+_random = random.Random()
@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from jupyter_server_synchronizer.coordinator import SyncCoordinator
+
+
+class SlowSync:
+    def __init__(self):
+        self.started = 0
+        self.running = 0
+        self.max_running = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.started += 1
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await self.release.wait()
+        finally:
+            self.running -= 1
+
+
+async def test_single_flight_with_one_follow_up():
+    sync = SlowSync()
+    coordinator = SyncCoordinator(sync)
+    first = coordinator.request()
+    await asyncio.sleep(0)
+    assert coordinator.running
+
+    # Requests arriving mid-sync share one follow-up.
+    follow_ups = [coordinator.request() for _ in range(3)]
+    # Or join the running sync.
+    joined = coordinator.request(fresh=False)
+
+    sync.release.set()
+    await asyncio.gather(first, *follow_ups, joined)
+    assert sync.started == 2
+    assert sync.max_running == 1
+    assert coordinator.runs == 2
+    assert coordinator.coalesced == 3
+    assert not coordinator.running
+
+
+async def test_follow_up_runs_after_failure():
+    calls = []
+
+    async def sync():
+        calls.append(None)
+        await asyncio.sleep(0)
+        if len(calls) == 1:
+            raise RuntimeError
+
+    coordinator = SyncCoordinator(sync)
+    first = coordinator.request()
+    follow_up = coordinator.request()
+    with pytest.raises(RuntimeError):
+        await first
+    await follow_up
+    assert len(calls) == 2
+
+
+async def test_cancelling_a_caller_does_not_cancel_the_sync():
+    sync = SlowSync()
+    coordinator = SyncCoordinator(sync)
+    first = coordinator.request()
+    second = coordinator.request(fresh=False)
+    await asyncio.sleep(0)
+    first.cancel()
+    sync.release.set()
+    await second
+    assert first.cancelled()
+    assert sync.started == 1
+    assert not coordinator.running
+
+
+async def test_sync_is_cancelled_with_its_last_caller():
+    sync = SlowSync()
+    coordinator = SyncCoordinator(sync)
+    first = coordinator.request()
+    second = coordinator.request(fresh=False)
+    follow_up = coordinator.request()
+    await asyncio.sleep(0)
+    first.cancel()
+    second.cancel()
+    # The queued follow-up is not affected, and starts right away.
+    while sync.started < 2:
+        await asyncio.sleep(0)
+    assert sync.max_running == 1
+
+    sync.release.set()
+    await follow_up
+    assert not coordinator.running
@@ -0,0 +1,289 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from types import SimpleNamespace
+
+import pytest
+from tornado import web
+from tornado.httpserver import HTTPServer
+from tornado.testing import bind_unused_port
+from tornado.web import Application, RequestHandler
+
+from jupyter_server_synchronizer.gateway import (
+    FederatedKernelPoller,
+    GatewayKernelPoller,
+    JSONArrayStreamDecoder,
+    _pollers,
+    close_gateway_poller,
+    fetch_gateway_kernels,
+)
+from jupyter_server_synchronizer.http_client import KeepAliveHTTPClient
+from jupyter_server_synchronizer.kernel_records import KernelRecord
+
+KERNELS = [{"id": f"kernel{i}", "name": "python3", "execution_state": "idle"} for i in range(50)]
+
+
+def decode_in_chunks(body, size):
+    decoder = JSONArrayStreamDecoder()
+    items = []
+    for i in range(0, len(body), size):
+        items.extend(decoder.feed(body[i : i + size]))
+    decoder.close()
+    return items
+
+
+@pytest.mark.parametrize("size", [1, 3, 17, 10_000])
+def test_json_array_stream_decoder(size):
+    body = json.dumps([*KERNELS, 12345, "café", [1, [2]], None], indent=1).encode()
+    assert decode_in_chunks(body, size) == [*KERNELS, 12345, "café", [1, [2]], None]
+
+
+def test_json_array_stream_decoder_keeps_only_the_remainder():
+    decoder = JSONArrayStreamDecoder()
+    assert decoder.feed(b'[{"id": "a"}, {"id"') == [{"id": "a"}]
+    assert decoder._buffer == '{"id"'
+    assert decoder.feed(b': "b"}]') == [{"id": "b"}]
+    decoder.close()
+
+
+@pytest.mark.parametrize("body", [b"", b"{}", b'[{"id": "a"}'])
+def test_json_array_stream_decoder_errors(body):
+    def decode():
+        decoder = JSONArrayStreamDecoder()
+        decoder.feed(body)
+        decoder.close()
+
+    with pytest.raises(ValueError):
+        decode()
+
+
+class KernelsHandler(RequestHandler):
+    def initialize(self, gateway):
+        self.gateway = gateway
+
+    async def get(self):
+        gateway = self.gateway
+        gateway.requests.append(self.request.headers)
+        if gateway.delay:
+            await asyncio.sleep(gateway.delay)
+        if gateway.status != 200:
+            self.send_error(gateway.status)
+            return
+        body = json.dumps(gateway.kernels).encode()
+        if gateway.etags:
+            etag = f'"{hashlib.sha256(body).hexdigest()}"'
+            if self.request.headers.get("If-None-Match") == etag:
+                self.set_status(304)
+                return
+            self.set_header("ETag", etag)
+        # Send the body in several chunks.
+        for i in range(0, len(body), 100):
+            self.write(body[i : i + 100])
+            self.flush()
+
+
+class StubGateway:
+    def __init__(self):
+        self.kernels = list(KERNELS)
+        self.etags = True
+        self.status = 200
+        self.delay = 0
+        self.requests = []
+
+
+@pytest.fixture()
+def make_stub_gateway():
+    """Returns a function that starts a new stub gateway."""
+    servers = []
+
+    def make():
+        gateway = StubGateway()
+        sock, port = bind_unused_port()
+        server = HTTPServer(Application([("/api/kernels", KernelsHandler, {"gateway": gateway})]))
+        server.add_sockets([sock])
+        servers.append(server)
+        gateway.url = f"http://127.0.0.1:{port}"
+        return gateway
+
+    yield make
+    for server in servers:
+        server.stop()
+
+
+@pytest.fixture()
+def stub_gateway(make_stub_gateway):
+    return make_stub_gateway()
+
+
+class FakeSynchronizer:
+    kernel_record_class = KernelRecord
+    gateway_request_timeout = 10.0
+    gateway_max_connections = 2
+    gateway_connect_timeout = 5.0
+    log = logging.getLogger(__name__)
+
+    def __init__(self, url, gateway_urls=(), keep_alive=False):
+        self.kernel_manager = SimpleNamespace(kernels_url=f"{url}/api/kernels")
+        self.gateway_urls = list(gateway_urls)
+        self.gateway_keep_alive = keep_alive
+
+
+@pytest.fixture(params=["shared", "keep-alive"])
+def http_client(request):
+    """The HTTP client to poll with: Jupyter Server's shared Gateway
+    client, or a keep-alive client.
+    """
+    if request.param == "shared":
+        yield None
+        return
+    client = KeepAliveHTTPClient()
+    yield client
+    client.close()
+
+
+@pytest.fixture()
+def synchronizer(jp_environ, stub_gateway):
+    return FakeSynchronizer(stub_gateway.url)
+
+
+async def test_fetch_gateway_kernels(synchronizer):
+    records = await fetch_gateway_kernels(synchronizer)
+    assert [r.kernel_id for r in records] == [k["id"] for k in KERNELS]
+    assert all(r.alive and r.kernel_name == "python3" for r in records)
+
+
+async def test_fetch_gateway_kernels_keeps_connections_alive(jp_environ, stub_gateway):
+    synchronizer = FakeSynchronizer(stub_gateway.url, keep_alive=True)
+    for _ in range(3):
+        await fetch_gateway_kernels(synchronizer)
+    poller = _pollers[synchronizer]
+    assert poller.timeout == synchronizer.gateway_request_timeout
+    client = poller.client
+    assert client.requests == 3
+    assert client.connections_opened == 1
+
+    close_gateway_poller(synchronizer)
+    assert synchronizer not in _pollers
+
+
+async def test_fetch_gateway_kernels_through_the_shared_client(synchronizer):
+    assert len(await fetch_gateway_kernels(synchronizer)) == len(KERNELS)
+    assert _pollers[synchronizer].client is None
+    # Only the Gateway client's request timeout applies.
+    assert _pollers[synchronizer].timeout is None
+
+
+async def test_poller_uses_etags(synchronizer, stub_gateway, http_client):
+    poller = GatewayKernelPoller(client=http_client)
+    records = await poller.poll(synchronizer)
+    assert "If-None-Match" not in stub_gateway.requests[0]
+
+    # Nothing changed: the gateway answers 304 and the cached list is reused.
+    assert await poller.poll(synchronizer) is records
+    assert stub_gateway.requests[1]["If-None-Match"] == poller.etag
+
+    stub_gateway.kernels = stub_gateway.kernels[1:]
+    changed = await poller.poll(synchronizer)
+    assert changed is not records
+    assert len(changed) == len(KERNELS) - 1
+
+
+async def test_poller_compares_bodies_without_validators(synchronizer, stub_gateway, http_client):
+    stub_gateway.etags = False
+    poller = GatewayKernelPoller(client=http_client)
+    records = await poller.poll(synchronizer)
+    assert await poller.poll(synchronizer) is records
+    assert "If-None-Match" not in stub_gateway.requests[1]
+
+    stub_gateway.kernels = stub_gateway.kernels[1:]
+    assert await poller.poll(synchronizer) is not records
+
+
+async def test_poller_backs_off_on_errors(synchronizer, stub_gateway, http_client):
+    stub_gateway.status = 500
+    poller = GatewayKernelPoller(client=http_client)
+    with pytest.raises(web.HTTPError):
+        await poller.poll(synchronizer)
+    assert len(stub_gateway.requests) == 1
+
+    # Polls fail fast until the backoff delay has passed.
+    with pytest.raises(web.HTTPError, match="backing off"):
+        await poller.poll(synchronizer)
+    assert len(stub_gateway.requests) == 1
+
+    poller._retry_at = 0
+    with pytest.raises(web.HTTPError):
+        await poller.poll(synchronizer)
+    assert poller.failures == 2
+    assert poller._retry_at - time.monotonic() > poller.backoff_factor
+
+    poller._retry_at = 0
+    stub_gateway.status = 200
+    assert len(await poller.poll(synchronizer)) == len(KERNELS)
+    assert poller.failures == 0
+
+
+async def test_poller_backs_off_when_slow(synchronizer, stub_gateway, monkeypatch, http_client):
+    monkeypatch.setattr(GatewayKernelPoller, "slow_response", 0)
+    poller = GatewayKernelPoller(client=http_client)
+    records = await poller.poll(synchronizer)
+    # The slow gateway is not polled again for a while.
+    assert await poller.poll(synchronizer) is records
+    assert len(stub_gateway.requests) == 1
+
+
+@pytest.fixture()
+def gateways(make_stub_gateway):
+    first, second = make_stub_gateway(), make_stub_gateway()
+    first.kernels = KERNELS[:2]
+    second.kernels = KERNELS[2:3]
+    return first, second
+
+
+async def test_fetch_federated_gateway_kernels(jp_environ, gateways):
+    urls = [gateway.url for gateway in gateways]
+    synchronizer = FakeSynchronizer(gateways[0].url, gateway_urls=urls)
+    records = await fetch_gateway_kernels(synchronizer)
+    assert [(r.kernel_id, r.origin) for r in records] == [
+        ("kernel0", urls[0]),
+        ("kernel1", urls[0]),
+        ("kernel2", urls[1]),
+    ]
+    # Nothing changed on any gateway.
+    assert await fetch_gateway_kernels(synchronizer) is records
+
+    gateways[1].kernels = []
+    records = await fetch_gateway_kernels(synchronizer)
+    assert [r.kernel_id for r in records] == ["kernel0", "kernel1"]
+
+
+async def test_federated_poller_keeps_kernels_of_failed_gateways(
+    jp_environ, gateways, caplog, http_client
+):
+    synchronizer = FakeSynchronizer(gateways[0].url)
+    poller = FederatedKernelPoller([gateway.url for gateway in gateways], client=http_client)
+    records = await poller.poll(synchronizer)
+
+    gateways[1].status = 500
+    assert await poller.poll(synchronizer) is records
+    assert "Could not poll the gateway" in caplog.text
+
+    gateways[0].kernels = KERNELS[:1]
+    assert [r.kernel_id for r in await poller.poll(synchronizer)] == ["kernel0", "kernel2"]
+
+
+async def test_federated_poller_times_out_slow_gateways(jp_environ, gateways, http_client):
+    synchronizer = FakeSynchronizer(gateways[0].url)
+    poller = FederatedKernelPoller(
+        [gateway.url for gateway in gateways], timeout=0.2, client=http_client
+    )
+    gateways[1].delay = 5
+    start = time.monotonic()
+    records = await poller.poll(synchronizer)
+    assert time.monotonic() - start < 5
+    assert [r.kernel_id for r in records] == ["kernel0", "kernel1"]
+    # The slow gateway is not polled again until its backoff delay passed.
+    await poller.poll(synchronizer)
+    assert len(gateways[1].requests) == 1
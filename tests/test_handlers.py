@@ -0,0 +1,25 @@
+import json
+
+import pytest
+
+
+@pytest.fixture()
+def jp_server_config(tmp_path):
+    return {
+        "ServerApp": {
+            "jpserver_extensions": {"jupyter_server_synchronizer": True},
+            "session_manager_class": "jupyter_server_synchronizer.SynchronizerSessionManager",
+        },
+        "SynchronizerSessionManager": {"database_filepath": str(tmp_path / "jupyter-session.db")},
+    }
+
+
+async def test_diagnostics(jp_fetch, jp_serverapp):
+    manager = jp_serverapp.session_manager
+    manager._last_synced = None
+    response = await jp_fetch("api", "sync", "diagnostics")
+    assert response.code == 200
+    diagnostics = json.loads(response.body)
+    assert diagnostics["seconds_since_last_sync"] is None
+    assert diagnostics["records"] == []
+    assert diagnostics["sync"]["runs"] == 0
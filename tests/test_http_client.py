@@ -0,0 +1,105 @@
+import asyncio
+import json
+
+import pytest
+from tornado.httpclient import HTTPClientError
+from tornado.httpserver import HTTPServer
+from tornado.testing import bind_unused_port
+from tornado.web import Application, RequestHandler
+
+from jupyter_server_synchronizer.http_client import KeepAliveHTTPClient
+
+BODY = json.dumps([{"id": f"kernel{i}", "name": "python3"} for i in range(1000)]).encode()
+
+
+class Handler(RequestHandler):
+    async def get(self, status):
+        server = self.application.settings["stub"]
+        server.active += 1
+        server.max_active = max(server.max_active, server.active)
+        await asyncio.sleep(server.delay)
+        server.active -= 1
+        if self.get_argument("close", None):
+            self.set_header("Connection", "close")
+        self.set_status(int(status))
+        self.write(BODY)
+
+
+class StubServer:
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+        self.delay = 0
+
+
+@pytest.fixture()
+def stub_server():
+    stub = StubServer()
+    sock, port = bind_unused_port()
+    stub.server = HTTPServer(Application([(r"/(\d+)", Handler)], stub=stub, compress_response=True))
+    stub.server.add_sockets([sock])
+    stub.url = f"http://127.0.0.1:{port}"
+    yield stub
+    stub.server.stop()
+
+
+@pytest.fixture()
+def client():
+    client = KeepAliveHTTPClient()
+    yield client
+    client.close()
+
+
+async def fetch(client, url, **kwargs):
+    chunks = []
+    lines = []
+    headers = await client.fetch(
+        url, header_callback=lines.append, streaming_callback=chunks.append, **kwargs
+    )
+    return headers, lines, b"".join(chunks)
+
+
+async def test_connections_are_kept_alive(client, stub_server):
+    for _ in range(3):
+        headers, lines, body = await fetch(client, f"{stub_server.url}/200")
+        assert body == BODY
+        assert lines[0].startswith("HTTP/1.1 200")
+        assert lines[-1] == "\r\n"
+    # The body was compressed.
+    assert headers["X-Consumed-Content-Encoding"] == "gzip"
+    assert client.requests == 3
+    assert client.connections_opened == 1
+
+
+async def test_connections_closed_by_the_server(client, stub_server):
+    await fetch(client, f"{stub_server.url}/200?close=1")
+    await fetch(client, f"{stub_server.url}/200")
+    assert client.connections_opened == 2
+
+    # The server drops the idle connection; the next request reconnects.
+    await stub_server.server.close_all_connections()
+    _, _, body = await fetch(client, f"{stub_server.url}/200")
+    assert body == BODY
+    assert client.connections_opened == 3
+
+
+async def test_errors(client, stub_server):
+    with pytest.raises(HTTPClientError) as e:
+        await fetch(client, f"{stub_server.url}/500")
+    assert e.value.code == 500
+    # The connection is reused after an error response.
+    with pytest.raises(HTTPClientError):
+        await fetch(client, f"{stub_server.url}/404")
+    assert client.connections_opened == 1
+
+    with pytest.raises(ValueError, match="Unsupported URL"):
+        await fetch(client, "ftp://127.0.0.1/")
+
+
+async def test_max_connections(stub_server):
+    client = KeepAliveHTTPClient(max_connections=2)
+    stub_server.delay = 0.05
+    await asyncio.gather(*(fetch(client, f"{stub_server.url}/200") for _ in range(5)))
+    client.close()
+    assert stub_server.max_active == 2
+    assert client.connections_opened == 2
@@ -1,10 +1,11 @@
 import sqlite3
+import threading
 from dataclasses import dataclass
 from typing import Union
 
 import pytest
 
-from jupyter_server_synchronizer.kernel_db import KernelTable
+from jupyter_server_synchronizer.kernel_db import AsyncKernelTable, KernelTable
 from jupyter_server_synchronizer.kernel_records import KernelRecord
 
 
@@ -140,3 +141,279 @@ def test_update_custom_kernelrecord(jp_environ):
     assert isinstance(record, CustomKernelRecord)
     assert record.kernel_id == "kernel1"
     assert record.remote_id == "remote1"
+
+
+def test_save_many_and_delete_many(jp_environ):
+    table = KernelTable()
+    records = [KernelRecord(kernel_id=f"kernel{i}", kernel_name="python3") for i in range(5)]
+    table.save_many(records)
+    assert len(table.list()) == 5
+
+    table.delete_many(records[:3])
+    assert sorted(r.kernel_id for r in table.list()) == ["kernel3", "kernel4"]
+
+
+def test_update_many_custom_kernelrecords(jp_environ):
+    table = KernelTable(kernel_record_class=CustomKernelRecord)
+    table.save_many(
+        [CustomKernelRecord(kernel_id="kernel1"), CustomKernelRecord(remote_id="remote2")]
+    )
+    table.update_many(
+        [
+            CustomKernelRecord(kernel_id="kernel1", remote_id="remote1"),
+            CustomKernelRecord(kernel_id="kernel2", remote_id="remote2"),
+        ]
+    )
+    assert table.get(remote_id="remote1").kernel_id == "kernel1"
+    assert table.get(kernel_id="kernel2").remote_id == "remote2"
+
+    # Unset fields don't overwrite stored values.
+    table.update(CustomKernelRecord(kernel_id="kernel1", kernel_name="python3"))
+    assert table.get(kernel_id="kernel1").remote_id == "remote1"
+
+
+def test_update_many_rolls_back_missing_records(jp_environ):
+    table = KernelTable()
+    table.save(KernelRecord(kernel_id="kernel1"))
+    with pytest.raises(Exception):  # noqa: B017
+        table.update_many(
+            [
+                KernelRecord(kernel_id="kernel1", kernel_name="python3"),
+                KernelRecord(kernel_id="missing"),
+            ]
+        )
+    assert table.get(kernel_id="kernel1").kernel_name is None
+
+
+def test_values_are_parameterized(jp_environ):
+    table = KernelTable()
+    record = KernelRecord(kernel_id="kernel'1", kernel_name="it's")
+    table.save(record)
+    assert table.get(kernel_id="kernel'1").kernel_name == "it's"
+    table.update(KernelRecord(kernel_id="kernel'1", kernel_name="'; DROP TABLE kerneltable; --"))
+    assert table.get(kernel_id="kernel'1").kernel_name == "'; DROP TABLE kerneltable; --"
+
+
+def test_transaction_rolls_back(jp_environ):
+    table = KernelTable()
+
+    def save_then_fail():
+        with table.transaction():
+            table.save(KernelRecord(kernel_id="kernel1"))
+            raise RuntimeError
+
+    with pytest.raises(RuntimeError):
+        save_then_fail()
+    assert table.list() == []
+    assert not table.connection.in_transaction
+
+
+def test_identifier_columns_are_unique(jp_environ):
+    table = KernelTable(kernel_record_class=CustomKernelRecord)
+    indexes = {
+        row["name"]: row["unique"] for row in table.cursor.execute("PRAGMA index_list(kerneltable)")
+    }
+    assert indexes == {"kerneltable_kernel_id": 1, "kerneltable_remote_id": 1}
+
+    table.save(CustomKernelRecord(kernel_id="kernel1"))
+    with pytest.raises(sqlite3.IntegrityError):
+        table.save(CustomKernelRecord(kernel_id="kernel1"))
+    # Multiple rows may lack an identifier.
+    table.save(CustomKernelRecord(kernel_id="kernel2"))
+    assert len(table.list()) == 2
+
+
+def test_duplicate_rows_are_dropped_before_indexing(jp_environ, jp_runtime_dir):
+    path = jp_runtime_dir / "jupyter-session.db"
+    connection = sqlite3.connect(str(path))
+    connection.execute("CREATE TABLE kerneltable (kernel_id, kernel_name)")
+    connection.execute("INSERT INTO kerneltable VALUES ('kernel1', 'python3'), ('kernel1', 'R')")
+    connection.commit()
+    connection.close()
+
+    table = KernelTable(database_filepath=str(path))
+    assert table.get(kernel_id="kernel1").kernel_name == "python3"
+    assert len(table.list()) == 1
+
+
+def test_pragmas(jp_environ, jp_runtime_dir):
+    path = jp_runtime_dir / "jupyter-session.db"
+    table = KernelTable(database_filepath=str(path))
+    connection = table.connection
+    assert connection.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+    assert connection.execute("PRAGMA synchronous").fetchone()[0] == 2
+    connection.close()
+
+    table = KernelTable(
+        database_filepath=str(path),
+        journal_mode="WAL",
+        synchronous="NORMAL",
+        cache_size=-4096,
+        mmap_size=1 << 20,
+    )
+    connection = table.connection
+    assert connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert connection.execute("PRAGMA synchronous").fetchone()[0] == 1
+    assert connection.execute("PRAGMA cache_size").fetchone()[0] == -4096
+    assert connection.execute("PRAGMA mmap_size").fetchone()[0] == 1 << 20
+
+
+def test_upsert_kernelrecord(jp_environ):
+    table = KernelTable()
+    table.upsert(KernelRecord(kernel_id="kernel1"))
+    table.upsert(KernelRecord(kernel_id="kernel1", kernel_name="python3"))
+    table.upsert(KernelRecord(kernel_id="kernel1"))
+    things = table.list()
+    assert len(things) == 1
+    assert things[0].kernel_name == "python3"
+
+
+def test_upsert_many_custom_kernelrecords(jp_environ):
+    table = KernelTable(kernel_record_class=CustomKernelRecord)
+    table.save(CustomKernelRecord(kernel_id="kernel1"))
+    table.upsert_many(
+        [
+            CustomKernelRecord(kernel_id="kernel1", remote_id="remote1"),
+            CustomKernelRecord(kernel_id="kernel2", remote_id="remote2"),
+        ]
+    )
+    assert table.get(kernel_id="kernel1").remote_id == "remote1"
+    assert table.get(remote_id="remote2").kernel_id == "kernel2"
+    assert len(table.list()) == 2
+
+
+async def test_async_kernel_table(jp_environ):
+    table = AsyncKernelTable(KernelTable())
+    await table.upsert_many([KernelRecord(kernel_id="kernel1"), KernelRecord(kernel_id="kernel2")])
+    assert await table.exists(kernel_id="kernel1")
+    await table.delete_many([KernelRecord(kernel_id="kernel1")])
+    assert [r.kernel_id for r in await table.list()] == ["kernel2"]
+
+    thread_name = await table.run(lambda: threading.current_thread().name)
+    assert thread_name.startswith("kernel-table")
+    # The table can still be used synchronously.
+    assert table.table.get(kernel_id="kernel2").kernel_id == "kernel2"
+    table.close()
+
+
+def test_list_is_cached(jp_environ):
+    table = KernelTable()
+    table.save(KernelRecord(kernel_id="kernel1", kernel_name="python3"))
+    assert [r.kernel_id for r in table.list()] == ["kernel1"]
+
+    statements = []
+    table.connection.set_trace_callback(statements.append)
+    records = table.list()
+    assert not any("kerneltable" in s for s in statements)
+    # The cached records are not handed out.
+    records[0].kernel_name = "python2"
+    assert table.list()[0].kernel_name == "python3"
+
+
+def test_list_cache_sees_own_writes(jp_environ):
+    table = KernelTable()
+    table.save(KernelRecord(kernel_id="kernel1", kernel_name="python3"))
+    assert len(table.list()) == 1
+    table.upsert(KernelRecord(kernel_id="kernel1", kernel_name="python2"))
+    assert table.list()[0].kernel_name == "python2"
+    table.delete(kernel_id="kernel1")
+    assert table.list() == []
+    table.cursor.execute("INSERT INTO kerneltable (kernel_id) VALUES ('kernel2')")
+    assert [r.kernel_id for r in table.list()] == ["kernel2"]
+
+
+def test_list_cache_sees_other_connections(jp_environ, jp_runtime_dir):
+    path = str(jp_runtime_dir / "jupyter-session.db")
+    table = KernelTable(database_filepath=path)
+    other = KernelTable(database_filepath=path)
+    table.save(KernelRecord(kernel_id="kernel1", kernel_name="python3"))
+    assert len(other.list()) == 1
+    version = other.version
+
+    table.save(KernelRecord(kernel_id="kernel2", kernel_name="python3"))
+    assert other.version != version
+    assert {r.kernel_id for r in other.list()} == {"kernel1", "kernel2"}
+
+
+def test_lease_columns_are_added_to_old_tables(jp_environ, jp_runtime_dir):
+    path = jp_runtime_dir / "jupyter-session.db"
+    connection = sqlite3.connect(str(path))
+    connection.execute("CREATE TABLE kerneltable (kernel_id, kernel_name)")
+    connection.execute("INSERT INTO kerneltable VALUES ('kernel1', 'python3')")
+    connection.commit()
+    connection.close()
+
+    table = KernelTable(database_filepath=str(path))
+    assert table.claim_many([KernelRecord(kernel_id="kernel1")], "server1", 10.0, 0.0) == {
+        "kernel1"
+    }
+    assert table.get(kernel_id="kernel1").kernel_name == "python3"
+    assert table.leases() == {"kernel1": ("server1", 10.0)}
+
+
+def test_claim_many(jp_environ, jp_runtime_dir):
+    path = str(jp_runtime_dir / "jupyter-session.db")
+    table = KernelTable(database_filepath=path)
+    other = KernelTable(database_filepath=path)
+    table.save(KernelRecord(kernel_id="kernel1", kernel_name="python3"))
+    records = [KernelRecord(kernel_id="kernel1"), KernelRecord(kernel_id="kernel2")]
+
+    assert table.claim_many(records, "server1", 10.0, 0.0) == {"kernel1", "kernel2"}
+    # A new row only holds the lease; claiming does not change records.
+    assert table.get(kernel_id="kernel1").kernel_name == "python3"
+    assert table.get(kernel_id="kernel2").kernel_name is None
+
+    # Leases are only taken over once they expire.
+    assert other.claim_many(records, "server2", 20.0, 5.0) == set()
+    assert table.claim_many(records[:1], "server1", 15.0, 5.0) == {"kernel1"}
+    assert other.claim_many(records, "server2", 20.0, 12.0) == {"kernel2"}
+    assert other.leases() == {"kernel1": ("server1", 15.0), "kernel2": ("server2", 20.0)}
+
+    table.renew_leases("server1", 30.0)
+    assert other.leases()["kernel1"] == ("server1", 30.0)
+
+
+def test_changes_since(jp_environ):
+    table = KernelTable()
+    table.save(KernelRecord(kernel_id="kernel1", kernel_name="python3"))
+    changes = table.changes_since(None)
+    assert changes.reset
+    assert [r.kernel_id for r in changes.records.values()] == ["kernel1"]
+    version = changes.version
+    assert table.changes_since(version).records == {}
+
+    table.upsert_many([KernelRecord(kernel_id="kernel1"), KernelRecord(kernel_id="kernel2")])
+    table.update(KernelRecord(kernel_id="kernel2", kernel_name="python2"))
+    # Extending a lease is not a change.
+    table.claim_many([KernelRecord(kernel_id="kernel1")], "server1", 10.0, 0.0)
+    table.renew_leases("server1", 20.0)
+    changes = table.changes_since(version)
+    assert not changes.reset
+    assert {r.kernel_id: r.kernel_name for r in changes.records.values()} == {
+        "kernel1": "python3",
+        "kernel2": "python2",
+    }
+    assert sorted(changes.owners.values(), key=str) == [None, "server1"]
+
+    version = changes.version
+    table.delete(kernel_id="kernel1")
+    # Writes that bypass the KernelTable are logged too.
+    table.cursor.execute("INSERT INTO kerneltable (kernel_id) VALUES ('kernel3')")
+    changes = table.changes_since(version)
+    assert sorted((r and r.kernel_id) or "" for r in changes.records.values()) == ["", "kernel3"]
+    assert table.change_version == changes.version
+
+
+def test_change_log_compaction(jp_environ):
+    table = KernelTable(change_log_retention=5)
+    table.save_many([KernelRecord(kernel_id=f"kernel{i}") for i in range(10)])
+    version = table.change_version
+    table.compact_change_log()
+    rows = table.cursor.execute("SELECT version FROM kerneltable_changes").fetchall()
+    assert [row["version"] for row in rows] == list(range(version - 4, version + 1))
+
+    # Readers behind the retained changes read the whole table again.
+    changes = table.changes_since(version - 6)
+    assert changes.reset
+    assert len(changes.records) == 10
+    assert not table.changes_since(version - 5).reset
@@ -179,3 +179,52 @@ def test_kernel_record_list_of_custom_records():
     records.remove(r2)
     assert r2 not in records
     assert len(records) == 1
+
+
+def test_kernel_record_list_index_follows_merged_identifiers():
+    records = KernelRecordList(CustomKernelRecord(kernel_id="kernel1"))
+    records.update(CustomKernelRecord(kernel_id="kernel1", remote_id="remote1"))
+    assert records.get("remote1").kernel_id == "kernel1"
+
+    # Identifiers assigned in-place are picked up after a reindex.
+    r = CustomKernelRecord(remote_id="remote3")
+    records.update(r)
+    r.kernel_id = "kernel3"
+    assert "kernel3" not in records
+    records.reindex(r)
+    assert records.get("kernel3") is r
+
+    records.remove(CustomKernelRecord(kernel_id="kernel3"))
+    assert "remote3" not in records
+    assert len(records) == 1
+
+
+def test_kernel_record_list_conflict():
+    records = KernelRecordList(CustomKernelRecord(kernel_id="kernel1", remote_id="remote1"))
+    with pytest.raises(KernelRecordConflict):
+        records.update(CustomKernelRecord(kernel_id="kernel2", remote_id="remote1"))
+    with pytest.raises(KernelRecordConflict):
+        _ = CustomKernelRecord(kernel_id="kernel1", remote_id="remote2") in records
+    assert len(records) == 1
+
+
+def test_kernel_record_is_slotted():
+    record = KernelRecord(kernel_id="kernel1")
+    assert not hasattr(record, "__dict__")
+    with pytest.raises(AttributeError):
+        record.not_a_field = True  # type:ignore[attr-defined]
+
+
+def test_field_metadata_per_class():
+    assert KernelRecord.fields() == [
+        "kernel_id",
+        "kernel_name",
+        "alive",
+        "recorded",
+        "managed",
+        "origin",
+    ]
+    assert CustomKernelRecord.fields()[-1] == "remote_id"
+    # Callers get a copy of the cached metadata.
+    CustomKernelRecord.get_identifier_fields().append("other_id")
+    assert CustomKernelRecord.get_identifier_fields() == ["kernel_id", "remote_id"]
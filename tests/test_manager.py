@@ -0,0 +1,937 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+from types import SimpleNamespace
+
+import pytest
+from jupyter_events import EventLogger
+from jupyter_server.gateway.gateway_client import GatewayClient
+from jupyter_server.services.contents.manager import ContentsManager
+from jupyter_server.services.kernels.kernelmanager import MappingKernelManager
+from prometheus_client import REGISTRY
+from traitlets import TraitError
+from traitlets.config import Configurable
+
+from jupyter_server_synchronizer import SynchronizerSessionManager
+from jupyter_server_synchronizer.kernel_db import KernelTable
+from jupyter_server_synchronizer.kernel_records import KernelRecord
+from jupyter_server_synchronizer.manager import KERNEL_ACTIONS_SCHEMA_ID, SyncSummary
+
+
+class FakeGateway:
+    """Stands in for a remote kernel service."""
+
+    def __init__(self):
+        self.kernels = {}
+        self.fetches = 0
+
+    async def fetch(self, synchronizer):
+        self.fetches += 1
+        return [
+            synchronizer.kernel_record_class(kernel_id=kid, kernel_name=name, alive=True)
+            for kid, name in self.kernels.items()
+        ]
+
+
+@pytest.fixture()
+def gateway():
+    return FakeGateway()
+
+
+def make_synchronizer(gateway, **kwargs):
+    kernel_manager = MappingKernelManager()
+    started = []
+
+    async def start_kernel(kernel_id=None, kernel_name=None, **kwargs):
+        started.append(kernel_id)
+        kernel_manager._kernels[kernel_id] = SimpleNamespace(
+            kernel_id=kernel_id, kernel_name=kernel_name
+        )
+        return kernel_id
+
+    kernel_manager.start_kernel = start_kernel
+    kwargs.setdefault("fetch_running_kernels", gateway.fetch)
+    manager = SynchronizerSessionManager(
+        kernel_manager=kernel_manager,
+        contents_manager=ContentsManager(),
+        **kwargs,
+    )
+    manager.started = started
+    return manager
+
+
+@pytest.fixture()
+def synchronizer(jp_environ, gateway):
+    return make_synchronizer(gateway)
+
+
+@pytest.fixture()
+def make_server(jp_environ, jp_runtime_dir, gateway):
+    """Returns a function that creates servers sharing a kernel database
+    and a gateway.
+    """
+    servers = []
+
+    def make(server_instance_id, lease_duration=30.0):
+        server = make_synchronizer(
+            gateway,
+            database_filepath=str(jp_runtime_dir / "jupyter-session.db"),
+            server_instance_id=server_instance_id,
+            lease_duration=lease_duration,
+        )
+        servers.append(server)
+        return server
+
+    yield make
+    for server in servers:
+        server.close()
+
+
+async def test_sync_kernels_hydrates_and_records(synchronizer, gateway):
+    gateway.kernels = {"kernel1": "python3", "kernel2": "python3"}
+    await synchronizer.sync_kernels()
+
+    assert sorted(synchronizer.started) == ["kernel1", "kernel2"]
+    assert {r.kernel_id for r in synchronizer.kernel_table.list()} == {"kernel1", "kernel2"}
+    for record in synchronizer._kernel_records:
+        assert record.alive
+        assert record.managed
+        assert record.recorded
+
+
+async def test_sync_kernels_steady_state_does_nothing(synchronizer, gateway, monkeypatch):
+    gateway.kernels = {"kernel1": "python3"}
+    await synchronizer.sync_kernels()
+    # The next sync sees our own writes; after that nothing changes.
+    deltas = await synchronizer.fetch_kernel_records()
+    synchronizer._settle_kernels()
+    assert not synchronizer._unsettled_records
+
+    async def fail(*args, **kwargs):
+        raise AssertionError
+
+    for method in ["upsert", "upsert_many", "delete", "delete_many"]:
+        monkeypatch.setattr(synchronizer.async_kernel_table, method, fail)
+    deltas = await synchronizer.fetch_kernel_records()
+    assert not any(deltas.values())
+    await synchronizer.sync_kernels()
+    assert synchronizer.started == ["kernel1"]
+
+
+async def test_sync_kernels_applies_deltas(synchronizer, gateway):
+    gateway.kernels = {"kernel1": "python3", "kernel2": "python3"}
+    await synchronizer.sync_kernels()
+
+    # kernel2 stops running remotely; kernel3 starts.
+    gateway.kernels = {"kernel1": "python3", "kernel3": "python3"}
+    deltas = await synchronizer.fetch_kernel_records()
+    assert [r.kernel_id for r in deltas["running"].added] == ["kernel3"]
+    assert [r.kernel_id for r in deltas["running"].removed] == ["kernel2"]
+    await synchronizer.remove_stale_kernels()
+    await synchronizer.hydrate_kernel_managers()
+    await synchronizer.record_kernels()
+
+    assert synchronizer.started == ["kernel1", "kernel2", "kernel3"]
+    assert {r.kernel_id for r in synchronizer.kernel_table.list()} == {"kernel1", "kernel3"}
+    assert not synchronizer._kernel_records.get("kernel2").alive
+
+
+async def test_sync_kernels_retries_failed_hydration(synchronizer, gateway, monkeypatch):
+    gateway.kernels = {"kernel1": "python3"}
+    start_kernel = synchronizer.kernel_manager.start_kernel
+
+    async def broken_start_kernel(**kwargs):
+        raise RuntimeError
+
+    monkeypatch.setattr(synchronizer.kernel_manager, "start_kernel", broken_start_kernel)
+    await synchronizer.sync_kernels()
+    assert not synchronizer._kernel_records.get("kernel1").managed
+
+    monkeypatch.setattr(synchronizer.kernel_manager, "start_kernel", start_kernel)
+    await synchronizer.sync_kernels()
+    assert synchronizer._kernel_records.get("kernel1").managed
+
+
+async def test_legacy_running_kernel_fetchers_still_work(jp_environ, gateway):
+    async def fetch(synchronizer):
+        for kid, name in gateway.kernels.items():
+            synchronizer._kernel_records.update(
+                synchronizer.kernel_record_class(kernel_id=kid, kernel_name=name, alive=True)
+            )
+
+    synchronizer = make_synchronizer(gateway, fetch_running_kernels=fetch)
+    gateway.kernels = {"kernel1": "python3"}
+    with pytest.warns(DeprecationWarning, match="_kernel_records"):
+        await synchronizer.sync_kernels()
+    assert synchronizer.started == ["kernel1"]
+    assert synchronizer._kernel_records.get("kernel1").alive
+
+    # A fetcher that merges nothing reports that no kernels are running.
+    gateway.kernels = {}
+    await synchronizer.sync_kernels()
+    assert not synchronizer._kernel_records.get("kernel1").alive
+
+
+async def test_only_kernels_of_the_own_gateway_are_hydrated(jp_environ, gateway, monkeypatch):
+    async def fetch(synchronizer):
+        return [
+            synchronizer.kernel_record_class(
+                kernel_id=kid, kernel_name="python3", alive=True, origin=origin
+            )
+            for kid, origin in gateway.kernels.items()
+        ]
+
+    monkeypatch.setattr(GatewayClient.instance(), "url", "http://gateway-1:8888")
+    synchronizer = make_synchronizer(gateway, fetch_running_kernels=fetch)
+    gateway.kernels = {"kernel1": "http://gateway-1:8888/", "kernel2": "http://gateway-2:8888"}
+    await synchronizer.sync_kernels()
+    assert synchronizer.started == ["kernel1"]
+    assert {r.kernel_id for r in synchronizer.kernel_table.list()} == {"kernel1", "kernel2"}
+    # The other gateway's kernel needs nothing more.
+    assert not synchronizer._unsettled_records
+
+
+async def test_stale_recorded_kernels_are_removed(synchronizer, gateway):
+    synchronizer.kernel_table.save(KernelRecord(kernel_id="old-kernel"))
+    await synchronizer.sync_kernels()
+    assert synchronizer.kernel_table.list() == []
+    assert "old-kernel" not in synchronizer._kernel_records
+
+
+async def test_delete_stale_sessions(synchronizer):
+    synchronizer.kernel_manager._kernels["kernel1"] = SimpleNamespace(kernel_id="kernel1")
+    for session_id, kernel_id in [("session1", "kernel1"), ("session2", "kernel2")]:
+        synchronizer.cursor.execute(
+            "INSERT INTO session VALUES (?,?,?,?,?)",
+            (session_id, session_id, session_id, "notebook", kernel_id),
+        )
+    await synchronizer.delete_stale_sessions()
+    rows = synchronizer.cursor.execute("SELECT session_id FROM session").fetchall()
+    assert [row["session_id"] for row in rows] == ["session1"]
+
+
+async def test_sessions_created_while_deleting_are_kept(synchronizer, monkeypatch):
+    table = synchronizer.async_kernel_table
+    run = table.run
+
+    async def run_then_create_session(func, *args):
+        result = await run(func, *args)
+        if func == synchronizer._fetch_session_kernel_ids:
+            # A session and its kernel are created after the sessions were read.
+            synchronizer.kernel_manager._kernels["kernel2"] = SimpleNamespace(kernel_id="kernel2")
+            synchronizer.cursor.execute(
+                "INSERT INTO session VALUES (?,?,?,?,?)",
+                ("session2", "session2", "session2", "notebook", "kernel2"),
+            )
+        return result
+
+    monkeypatch.setattr(table, "run", run_then_create_session)
+    synchronizer.cursor.execute(
+        "INSERT INTO session VALUES (?,?,?,?,?)",
+        ("session1", "session1", "session1", "notebook", "kernel1"),
+    )
+    await synchronizer.delete_stale_sessions()
+    rows = synchronizer.cursor.execute("SELECT session_id FROM session").fetchall()
+    assert [row["session_id"] for row in rows] == ["session2"]
+
+
+async def test_session_queries_run_on_the_database_thread(synchronizer, monkeypatch):
+    kernel_manager = synchronizer.kernel_manager
+    kernel_manager._kernels["kernel1"] = SimpleNamespace(
+        kernel_id="kernel1", update_env=lambda env: None
+    )
+    monkeypatch.setattr(kernel_manager, "kernel_model", lambda kernel_id: {"id": kernel_id})
+
+    async def shutdown_kernel(kernel_id):
+        pass
+
+    monkeypatch.setattr(kernel_manager, "shutdown_kernel", shutdown_kernel)
+    threads = set()
+    synchronizer.connection.set_trace_callback(lambda _: threads.add(threading.get_ident()))
+    session = await synchronizer.save_session("session1", path="a.ipynb", kernel_id="kernel1")
+    assert session["kernel"] == {"id": "kernel1"}
+    assert await synchronizer.session_exists("a.ipynb")
+    await synchronizer.update_session("session1", path="b.ipynb")
+    assert [s["path"] for s in await synchronizer.list_sessions()] == ["b.ipynb"]
+    await synchronizer.delete_session("session1")
+    assert await synchronizer.list_sessions() == []
+    synchronizer.connection.set_trace_callback(None)
+    assert threads == {await synchronizer.async_kernel_table.run(threading.get_ident)}
+
+
+async def test_concurrent_list_sessions_share_one_sync(synchronizer, gateway):
+    await asyncio.gather(*(synchronizer.list_sessions() for _ in range(5)))
+    assert gateway.fetches == 1
+
+
+async def test_list_sessions_staleness(synchronizer, gateway):
+    synchronizer.sync_max_staleness = 60
+    await synchronizer.list_sessions()
+    await synchronizer.list_sessions()
+    assert gateway.fetches == 1
+
+    synchronizer.sync_max_staleness = 0
+    await synchronizer.list_sessions()
+    assert gateway.fetches == 2
+
+
+async def test_list_sessions_background_sync(synchronizer, gateway):
+    synchronizer.sync_on_list_sessions = "background"
+    gateway.kernels = {"kernel1": "python3"}
+    polled = asyncio.Event()
+
+    async def slow_fetch(synchronizer):
+        await polled.wait()
+        return await gateway.fetch(synchronizer)
+
+    synchronizer.fetch_running_kernels = slow_fetch
+    assert await synchronizer.list_sessions() == []
+    # The sessions were listed without waiting for the sync.
+    assert synchronizer._sync_coordinator.running
+    polled.set()
+    await synchronizer._sync_coordinator.request(fresh=False)
+    assert gateway.fetches == 1
+    assert "kernel1" in synchronizer._kernel_records
+
+    synchronizer.sync_on_list_sessions = "off"
+    await synchronizer.list_sessions()
+    assert gateway.fetches == 1
+
+
+async def test_sync_managers_never_overlap(synchronizer, gateway, monkeypatch):
+    gateway.kernels = {"kernel1": "python3"}
+    running = 0
+    max_running = 0
+    fetch = gateway.fetch
+
+    async def slow_fetch(synchronizer):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return await fetch(synchronizer)
+
+    synchronizer.fetch_running_kernels = slow_fetch
+    await asyncio.gather(
+        synchronizer.sync_managers(),
+        synchronizer.sync_managers(),
+        synchronizer.list_sessions(),
+        synchronizer.sync_managers(),
+    )
+    assert max_running == 1
+    # One run, plus one follow-up shared by the later sync_managers calls.
+    assert gateway.fetches == 2
+    assert synchronizer.started == ["kernel1"]
+
+
+async def test_hydration_is_concurrent_and_bounded(synchronizer, gateway, monkeypatch):
+    synchronizer.hydration_concurrency = 3
+    gateway.kernels = {f"kernel{i}": "python3" for i in range(10)}
+    start_kernel = synchronizer.kernel_manager.start_kernel
+    running = 0
+    max_running = 0
+
+    async def slow_start_kernel(kernel_id=None, **kwargs):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        if kernel_id == "kernel5":
+            raise RuntimeError
+        return await start_kernel(kernel_id=kernel_id, **kwargs)
+
+    monkeypatch.setattr(synchronizer.kernel_manager, "start_kernel", slow_start_kernel)
+    await synchronizer.sync_kernels()
+    assert max_running == 3
+    assert len(synchronizer.started) == 9
+    assert not synchronizer._kernel_records.get("kernel5").managed
+    assert synchronizer._kernel_records.get("kernel6").managed
+
+
+async def test_shutdown_kernels_without_sessions(synchronizer, monkeypatch):
+    synchronizer.shutdown_concurrency = 2
+    synchronizer.shutdown_timeout = 0.05
+    ready = asyncio.get_running_loop().create_future()
+    ready.set_result(None)
+    pending = asyncio.get_running_loop().create_future()
+    kernels = synchronizer.kernel_manager._kernels
+    for i in range(6):
+        kernels[f"kernel{i}"] = SimpleNamespace(kernel_id=f"kernel{i}", ready=ready)
+    kernels["starting"] = SimpleNamespace(kernel_id="starting", ready=pending)
+    synchronizer.cursor.execute(
+        "INSERT INTO session VALUES (?,?,?,?,?)",
+        ("session0", "path0", "name0", "notebook", "kernel0"),
+    )
+    shut_down = []
+    running = 0
+    max_running = 0
+
+    async def shutdown_kernel(kernel_id, **kwargs):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        try:
+            # kernel1 hangs and times out.
+            await asyncio.sleep(1 if kernel_id == "kernel1" else 0.01)
+            shut_down.append(kernel_id)
+        finally:
+            running -= 1
+
+    monkeypatch.setattr(synchronizer.kernel_manager, "shutdown_kernel", shutdown_kernel)
+    await synchronizer.shutdown_kernels_without_sessions()
+    assert sorted(shut_down) == ["kernel2", "kernel3", "kernel4", "kernel5"]
+    assert max_running == 2
+
+
+async def test_delete_stale_sessions_at_scale(synchronizer):
+    n = 10_000
+    kernels = synchronizer.kernel_manager._kernels
+    for i in range(0, n, 2):
+        kernels[f"kernel{i}"] = SimpleNamespace(kernel_id=f"kernel{i}")
+    synchronizer.cursor.executemany(
+        "INSERT INTO session VALUES (?,?,?,?,?)",
+        ((f"session{i}", f"path{i}", f"name{i}", "notebook", f"kernel{i}") for i in range(n)),
+    )
+    statements = []
+    synchronizer.connection.set_trace_callback(statements.append)
+    await synchronizer.delete_stale_sessions()
+    synchronizer.connection.set_trace_callback(None)
+
+    rows = synchronizer.cursor.execute("SELECT kernel_id FROM session").fetchall()
+    assert len(rows) == n // 2
+    assert all(row["kernel_id"] in kernels for row in rows)
+    # Stale sessions are removed by one statement, not one per session.
+    deletes = [s for s in statements if s.startswith("DELETE FROM session")]
+    assert len(deletes) == 1
+
+
+async def test_unchanged_running_kernels_are_not_diffed(synchronizer, gateway, monkeypatch):
+    gateway.kernels = {"kernel1": "python3"}
+    records = await gateway.fetch(synchronizer)
+
+    async def fetch(synchronizer):
+        return records
+
+    monkeypatch.setattr(synchronizer, "fetch_running_kernels", fetch)
+    await synchronizer.sync_kernels()
+    observed = synchronizer._observed_records["running"]
+
+    deltas = await synchronizer.fetch_kernel_records()
+    assert not deltas["running"]
+    assert synchronizer._observed_records["running"] is observed
+
+
+async def test_unchanged_recorded_kernels_are_not_diffed(synchronizer, gateway):
+    gateway.kernels = {"kernel1": "python3"}
+    await synchronizer.sync_kernels()
+    # The second sync observes the records written by the first.
+    await synchronizer.sync_kernels()
+    observed = synchronizer._observed_records["recorded"]
+
+    deltas = await synchronizer.fetch_kernel_records()
+    assert not deltas["recorded"]
+    assert synchronizer._observed_records["recorded"] is observed
+
+    synchronizer.kernel_table.delete(kernel_id="kernel1")
+    deltas = await synchronizer.fetch_kernel_records()
+    assert [r.kernel_id for r in deltas["recorded"].removed] == ["kernel1"]
+
+
+async def test_recorded_kernels_are_read_incrementally(synchronizer, gateway):
+    gateway.kernels = {f"kernel{i}": "python3" for i in range(5)}
+    await synchronizer.sync_kernels()
+    await synchronizer.sync_kernels()
+    statements = []
+    synchronizer.kernel_table.connection.set_trace_callback(statements.append)
+
+    synchronizer.kernel_table.update(KernelRecord(kernel_id="kernel1", kernel_name="python2"))
+    synchronizer.kernel_table.delete(kernel_id="kernel2")
+    deltas = await synchronizer.fetch_kernel_records()
+    delta = deltas["recorded"]
+    assert [r.kernel_name for r in delta.changed] == ["python2"]
+    assert [r.kernel_id for r in delta.removed] == ["kernel2"]
+    assert not delta.added
+    # Only the changed rows were read.
+    assert not any("SELECT * FROM kerneltable" in s for s in statements)
+    observed = synchronizer._observed_records["recorded"]
+    assert observed.get("kernel1").kernel_name == "python2"
+    assert "kernel2" not in observed
+    assert len(observed) == 4
+
+
+async def test_kernel_sources_are_fetched_concurrently(synchronizer, gateway, monkeypatch):
+    other = FakeGateway()
+    started = []
+    both_started = asyncio.Event()
+
+    def waiting(fetch):
+        async def wait_for_the_other(synchronizer):
+            started.append(fetch)
+            if len(started) == 2:
+                both_started.set()
+            await both_started.wait()
+            return await fetch(synchronizer)
+
+        return wait_for_the_other
+
+    monkeypatch.setattr(synchronizer, "fetch_running_kernels", waiting(gateway.fetch))
+    synchronizer.kernel_sources = {"other": waiting(other.fetch)}
+    gateway.kernels = {"kernel1": "python3"}
+    other.kernels = {"kernel2": "python3"}
+    # Fetched one after the other, the first source would wait forever.
+    deltas = await asyncio.wait_for(synchronizer.fetch_kernel_records(), 5)
+    assert list(deltas) == ["running", "other", "recorded", "managed"]
+    assert [r.kernel_id for r in deltas["other"].added] == ["kernel2"]
+
+
+async def test_kernel_is_alive_while_any_source_reports_it(synchronizer, gateway):
+    other = FakeGateway()
+    synchronizer.kernel_sources = {"other": other.fetch}
+    gateway.kernels = {"kernel1": "python3"}
+    other.kernels = {"kernel1": "python3", "kernel2": "python3"}
+    await synchronizer.sync_kernels()
+    assert sorted(synchronizer.started) == ["kernel1", "kernel2"]
+
+    gateway.kernels = {}
+    await synchronizer.sync_kernels()
+    assert synchronizer._kernel_records.get("kernel1").alive
+
+    other.kernels = {"kernel2": "python3"}
+    await synchronizer.sync_kernels()
+    assert [r.kernel_id for r in synchronizer.kernel_table.list()] == ["kernel2"]
+
+
+async def test_failed_kernel_source_fails_the_fetch(synchronizer, gateway):
+    gateway.kernels = {"kernel1": "python3"}
+    # The second sync reads back the first one's writes.
+    await synchronizer.sync_kernels()
+    await synchronizer.sync_kernels()
+    fetches = gateway.fetches
+    table = synchronizer.kernel_table
+    table.delete(kernel_id="kernel1")
+    table.save(KernelRecord(kernel_id="old-kernel"))
+    other = FakeGateway()
+
+    async def fail(synchronizer):
+        raise RuntimeError
+
+    synchronizer.kernel_sources = {"failing": fail, "other": other.fetch}
+    observed = dict(synchronizer._observed_records)
+    with pytest.raises(RuntimeError):
+        await synchronizer.fetch_kernel_records()
+    # The other sources were fetched anyway.
+    assert gateway.fetches - fetches == other.fetches == 1
+    assert synchronizer._observed_records == observed
+
+    # The kernel table's changes are read again by the next sync: the
+    # deleted row is recorded again, and the added one is removed.
+    synchronizer.kernel_sources = {}
+    await synchronizer.sync_kernels()
+    assert [r.kernel_id for r in table.list()] == ["kernel1"]
+
+
+def test_kernel_source_names_are_checked(synchronizer):
+    with pytest.raises(TraitError):
+        synchronizer.kernel_sources = {"recorded": FakeGateway().fetch}
+
+
+def kernel_action(action, kernel_id, status="success"):
+    return {
+        "action": action,
+        "kernel_id": kernel_id,
+        "kernel_name": "python3",
+        "status": status,
+        "msg": "",
+    }
+
+
+async def test_kernel_events_update_records(synchronizer, gateway):
+    await synchronizer.apply_kernel_event(kernel_action("start", "kernel1"))
+    await synchronizer.apply_kernel_event(kernel_action("start", "kernel2", status="error"))
+    assert gateway.fetches == 0
+    assert [r.kernel_id for r in synchronizer.kernel_table.list()] == ["kernel1"]
+    record = synchronizer._kernel_records.get("kernel1")
+    assert record.alive
+    assert record.managed
+    assert record.recorded
+    assert not synchronizer._unsettled_records
+
+    synchronizer.cursor.execute(
+        "INSERT INTO session VALUES (?,?,?,?,?)", ("s1", "s1", "s1", "notebook", "kernel1")
+    )
+    await synchronizer.apply_kernel_event(kernel_action("shutdown", "kernel1"))
+    assert synchronizer.kernel_table.list() == []
+    assert "kernel1" not in synchronizer._kernel_records
+    assert synchronizer.cursor.execute("SELECT * FROM session").fetchall() == []
+
+
+async def test_kernel_events_wait_for_the_sync(synchronizer, gateway, monkeypatch):
+    gateway.kernels = {"kernel1": "python3"}
+    start_kernel = synchronizer.kernel_manager.start_kernel
+    hydrating = asyncio.Event()
+    resume = asyncio.Event()
+
+    async def slow_start_kernel(**kwargs):
+        hydrating.set()
+        await resume.wait()
+        return await start_kernel(**kwargs)
+
+    monkeypatch.setattr(synchronizer.kernel_manager, "start_kernel", slow_start_kernel)
+    sync = asyncio.ensure_future(synchronizer.sync_kernels())
+    await hydrating.wait()
+    # Hydrating a kernel emits a kernel action event in the middle of the sync.
+    event = asyncio.ensure_future(
+        synchronizer.apply_kernel_event(kernel_action("start", "kernel2"))
+    )
+    await asyncio.sleep(0.01)
+    assert not event.done()
+    assert "kernel2" not in synchronizer._kernel_records
+
+    resume.set()
+    await sync
+    await event
+    assert {r.kernel_id for r in synchronizer.kernel_table.list()} == {"kernel1", "kernel2"}
+
+
+async def test_sessions_do_not_wait_for_the_sync(synchronizer, gateway, monkeypatch):
+    synchronizer.sync_on_events = True
+    kernel_manager = synchronizer.kernel_manager
+    monkeypatch.setattr(
+        kernel_manager, "kernel_model", lambda kernel_id: {"id": kernel_id, "name": "python3"}
+    )
+    gateway.kernels = {"kernel1": "python3"}
+    start_kernel = kernel_manager.start_kernel
+    hydrating = asyncio.Event()
+    resume = asyncio.Event()
+
+    async def slow_start_kernel(**kwargs):
+        hydrating.set()
+        await resume.wait()
+        return await start_kernel(**kwargs)
+
+    monkeypatch.setattr(kernel_manager, "start_kernel", slow_start_kernel)
+    sync = asyncio.ensure_future(synchronizer.sync_kernels())
+    await asyncio.wait_for(hydrating.wait(), 5)
+    kernel_manager._kernels["kernel2"] = SimpleNamespace(kernel_id="kernel2")
+    session = await asyncio.wait_for(synchronizer.create_session(kernel_id="kernel2"), 5)
+    assert session["kernel"]["id"] == "kernel2"
+    # The kernel is recorded once the sync is done.
+    assert "kernel2" not in synchronizer._kernel_records
+
+    resume.set()
+    await sync
+    await asyncio.gather(*synchronizer._event_tasks)
+    assert {r.kernel_id for r in synchronizer.kernel_table.list()} == {"kernel1", "kernel2"}
+
+
+async def test_reconciliation_corrects_kernel_events(synchronizer, gateway):
+    gateway.kernels = {"kernel1": "python3"}
+    await synchronizer.sync_kernels()
+    # The remote kernel service does not know about this kernel.
+    await synchronizer.apply_kernel_event(kernel_action("start", "kernel2"))
+    assert {r.kernel_id for r in synchronizer.kernel_table.list()} == {"kernel1", "kernel2"}
+
+    await synchronizer.sync_kernels()
+    assert [r.kernel_id for r in synchronizer.kernel_table.list()] == ["kernel1"]
+    assert "kernel2" not in synchronizer._kernel_records
+
+
+async def test_subscribe_to_events(synchronizer):
+    event_logger = EventLogger()
+    synchronizer.parent = Configurable()
+    assert not synchronizer.subscribe_to_events()
+
+    synchronizer.parent.event_logger = event_logger
+    assert synchronizer.subscribe_to_events()
+    event_logger.emit(schema_id=KERNEL_ACTIONS_SCHEMA_ID, data=kernel_action("start", "kernel1"))
+    await event_logger.gather_listeners()
+    assert [r.kernel_id for r in synchronizer.kernel_table.list()] == ["kernel1"]
+
+
+async def test_regular_syncing_adapts_to_changes(synchronizer, gateway):
+    synchronizer.syncing_interval = 0.001
+    synchronizer.syncing_max_interval = 0.01
+    task = synchronizer.start_regular_syncing()
+    while gateway.fetches < 3:
+        await asyncio.sleep(0.001)
+    scheduler = synchronizer.sync_scheduler
+    assert scheduler.interval > synchronizer.syncing_interval
+
+    gateway.kernels = {"kernel1": "python3"}
+
+    async def wait_for_change():
+        while not scheduler.changed_ticks:
+            await asyncio.sleep(0.001)
+
+    await asyncio.wait_for(wait_for_change(), 5)
+    task.cancel()
+    # Stopping regular syncing cancels the sync in flight.
+    while synchronizer._sync_coordinator.running:
+        await asyncio.sleep(0)
+
+
+async def test_sync_metrics(synchronizer, gateway, monkeypatch):
+    def sample(name, **labels):
+        return REGISTRY.get_sample_value(f"jupyter_server_synchronizer_{name}", labels) or 0
+
+    before = {
+        "hydrated": sample("kernels_total", action="hydrated"),
+        "recorded": sample("kernels_total", action="recorded"),
+        "removed": sample("kernels_total", action="removed"),
+        "syncs": sample("phase_duration_seconds_count", phase="record_kernels"),
+        "errors": sample("errors_total", phase="fetch_running_kernels"),
+    }
+    gateway.kernels = {"kernel1": "python3", "kernel2": "python3"}
+    await synchronizer.sync_managers()
+    gateway.kernels = {"kernel1": "python3"}
+    await synchronizer.sync_managers()
+
+    async def fail(synchronizer):
+        raise RuntimeError
+
+    monkeypatch.setattr(synchronizer, "fetch_running_kernels", fail)
+    with pytest.raises(RuntimeError):
+        await synchronizer.sync_managers()
+
+    assert sample("kernels_total", action="hydrated") - before["hydrated"] == 2
+    assert sample("kernels_total", action="recorded") - before["recorded"] == 2
+    assert sample("kernels_total", action="removed") - before["removed"] == 1
+    assert sample("phase_duration_seconds_count", phase="record_kernels") - before["syncs"] == 2
+    assert sample("errors_total", phase="fetch_running_kernels") - before["errors"] == 1
+
+
+async def test_sync_summary_is_formatted_lazily(synchronizer, gateway, monkeypatch):
+    formatted = []
+    original = SyncSummary.__str__
+
+    def spy(self):
+        formatted.append(self)
+        return original(self)
+
+    monkeypatch.setattr(SyncSummary, "__str__", spy)
+    gateway.kernels = {"kernel1": "python3"}
+    synchronizer.log.setLevel("INFO")
+    await synchronizer.sync_kernels()
+    assert formatted == []
+
+    synchronizer.log.setLevel("DEBUG")
+    gateway.kernels = {"kernel2": "python3"}
+    deltas = await synchronizer.fetch_kernel_records()
+    summary = str(SyncSummary(synchronizer, deltas))
+    assert "running=1" in summary
+    assert "running=+1/-1/~0" in summary
+    assert "kernel2" in summary
+    assert formatted
+
+
+async def test_diagnostics(synchronizer, gateway):
+    gateway.kernels = {"kernel1": "python3"}
+    await synchronizer.sync_managers()
+    diagnostics = synchronizer.diagnostics()
+    assert diagnostics["observed"] == {"running": 1, "recorded": 0, "managed": 0}
+    assert diagnostics["records"] == [
+        {
+            "kernel_id": "kernel1",
+            "kernel_name": "python3",
+            "alive": True,
+            "recorded": True,
+            "managed": True,
+            "origin": None,
+        }
+    ]
+    assert diagnostics["sync"]["runs"] == 1
+
+
+def session_kernel_ids(server):
+    rows = server.cursor.execute("SELECT kernel_id FROM session").fetchall()
+    return {row["kernel_id"] for row in rows}
+
+
+def test_server_instance_ids_are_unique_to_each_process(synchronizer):
+    assert synchronizer.server_instance_id.endswith(f"-{os.getpid()}")
+
+
+async def test_servers_only_sync_their_own_kernels(make_server, gateway):
+    server1 = make_server("server1")
+    server2 = make_server("server2")
+    gateway.kernels = {"kernel1": "python3"}
+    await server1.kernel_started("kernel1", "python3")
+    server1.cursor.execute(
+        "INSERT INTO session VALUES (?,?,?,?,?)",
+        ("session1", "path1", "name1", "notebook", "kernel1"),
+    )
+    assert server2.kernel_table.leases()["kernel1"][0] == "server1"
+
+    await server2.sync_managers()
+    assert server2.started == []
+    assert "kernel1" not in server2._kernel_records
+    # The session of the other server's kernel is kept.
+    assert session_kernel_ids(server2) == {"kernel1"}
+    assert server2.diagnostics()["leases"]["foreign"] == 1
+
+    # A kernel leased by another server is not shut down either.
+    server2.kernel_manager._kernels["kernel1"] = SimpleNamespace(kernel_id="kernel1")
+    server2.cursor.execute("DELETE FROM session")
+    await server2.shutdown_kernels_without_sessions()
+    assert "kernel1" in server2.kernel_manager._kernels
+
+
+async def test_expired_leases_are_taken_over(make_server, gateway):
+    server1 = make_server("server1", lease_duration=0.1)
+    server2 = make_server("server2")
+    gateway.kernels = {"kernel1": "python3", "kernel2": "python3"}
+    for kernel_id in gateway.kernels:
+        await server1.kernel_started(kernel_id, "python3")
+    await server2.sync_kernels()
+    assert server2.started == []
+
+    # server1 stops renewing its leases.
+    await asyncio.sleep(0.15)
+    await server2.sync_kernels()
+    assert sorted(server2.started) == ["kernel1", "kernel2"]
+    assert server2.kernel_table.leases().keys() == {"kernel1", "kernel2"}
+    assert {owner for owner, _ in server2.kernel_table.leases().values()} == {"server2"}
+
+    # A restarted server1 finds its kernels leased by server2.
+    restarted = make_server("server1")
+    await restarted.sync_kernels()
+    assert restarted.started == []
+
+
+async def test_leases_are_renewed(make_server, gateway):
+    server = make_server("server1", lease_duration=0.3)
+    gateway.kernels = {"kernel1": "python3"}
+    await server.kernel_manager.start_kernel(kernel_id="kernel1", kernel_name="python3")
+    await server.kernel_started("kernel1", "python3")
+    (_, expires) = server.kernel_table.leases()["kernel1"]
+    await asyncio.sleep(0.15)
+    await server.sync_kernels()
+    assert server.kernel_table.leases()["kernel1"][1] > expires
+
+
+async def test_unrecorded_kernels_are_adopted_after_a_lease(make_server, gateway):
+    server = make_server("server1", lease_duration=0.1)
+    gateway.kernels = {"kernel1": "python3"}
+    await server.sync_kernels()
+    # Another server may have just started it.
+    assert server.started == []
+    assert server.diagnostics()["leases"]["awaiting_adoption"] == ["kernel1"]
+
+    await asyncio.sleep(0.15)
+    await server.sync_kernels()
+    assert server.started == ["kernel1"]
+    assert server.kernel_table.leases()["kernel1"][0] == "server1"
+
+
+SERVER_SCRIPT = """
+import asyncio
+import json
+import sys
+from types import SimpleNamespace
+
+from jupyter_server.services.contents.manager import ContentsManager
+from jupyter_server.services.kernels.kernelmanager import MappingKernelManager
+
+from jupyter_server_synchronizer import SynchronizerSessionManager
+
+database_filepath, server_instance_id, kernel_count, started, seconds = sys.argv[1:]
+
+
+async def fetch(synchronizer):
+    return [
+        synchronizer.kernel_record_class(kernel_id=f"kernel{i}", kernel_name="python3", alive=True)
+        for i in range(int(kernel_count))
+    ]
+
+
+async def main():
+    kernel_manager = MappingKernelManager()
+
+    async def start_kernel(kernel_id=None, kernel_name=None, **kwargs):
+        kernel_manager._kernels[kernel_id] = SimpleNamespace(
+            kernel_id=kernel_id, kernel_name=kernel_name
+        )
+        return kernel_id
+
+    kernel_manager.start_kernel = start_kernel
+    synchronizer = SynchronizerSessionManager(
+        kernel_manager=kernel_manager,
+        contents_manager=ContentsManager(),
+        fetch_running_kernels=fetch,
+        database_filepath=database_filepath,
+        server_instance_id=server_instance_id,
+        lease_duration=0.5,
+    )
+    # The kernels that this server started itself.
+    first, last = map(int, started.split(":"))
+    for i in range(first, last):
+        await kernel_manager.start_kernel(kernel_id=f"kernel{i}", kernel_name="python3")
+        await synchronizer.kernel_started(f"kernel{i}", "python3")
+    # Start syncing along with the other servers.
+    print("ready", flush=True)
+    sys.stdin.readline()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + float(seconds)
+    while loop.time() < deadline:
+        await synchronizer.sync_kernels()
+        await asyncio.sleep(0.02)
+    print(json.dumps(sorted(kernel_manager._kernels)))
+    synchronizer.close()
+
+
+asyncio.run(main())
+"""
+
+
+def test_servers_in_several_processes(jp_environ, tmp_path):
+    script = tmp_path / "server.py"
+    script.write_text(SERVER_SCRIPT)
+    database_filepath = str(tmp_path / "jupyter-session.db")
+    kernel_ids = {f"kernel{i}" for i in range(20)}
+
+    def start(server_instance_id, started):
+        process = subprocess.Popen(
+            [  # noqa: S603
+                sys.executable,
+                str(script),
+                database_filepath,
+                server_instance_id,
+                "20",
+                started,
+                "1.5",
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        assert process.stdout.readline() == "ready\n"
+        return process
+
+    def hydrated(*processes):
+        for process in processes:
+            process.stdin.write("go\n")
+            process.stdin.flush()
+        results = []
+        for process in processes:
+            stdout, _ = process.communicate(timeout=60)
+            assert process.returncode == 0
+            results.append(set(json.loads(stdout)))
+        return results
+
+    # Each server keeps the kernels it started, for longer than a lease,
+    # and the kernels that no server recorded are adopted by exactly one.
+    server1, server2 = hydrated(start("server1", "0:8"), start("server2", "8:16"))
+    assert server1 | server2 == kernel_ids
+    assert not server1 & server2
+    assert {f"kernel{i}" for i in range(8)} <= server1
+    assert {f"kernel{i}" for i in range(8, 16)} <= server2
+
+    # server1 is gone: once its leases expire, server2 takes its kernels over.
+    assert hydrated(start("server2", "0:0")) == [kernel_ids]
+    table = KernelTable(database_filepath=database_filepath)
+    assert {owner for owner, _ in table.leases().values()} == {"server2"}
@@ -0,0 +1,103 @@
+import asyncio
+import random
+import time
+
+from jupyter_server_synchronizer.scheduler import SyncScheduler
+
+
+class Ticks:
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+async def test_interval_adapts_to_changes():
+    scheduler = SyncScheduler(
+        Ticks(False, False, False, True, RuntimeError("boom"), False),
+        min_interval=1,
+        max_interval=3,
+        backoff_factor=2,
+    )
+    intervals = []
+    for _ in range(6):
+        await scheduler.tick()
+        intervals.append(scheduler.interval)
+    # Idle ticks grow the interval up to the maximum, a change resets it
+    # and a failure keeps it.
+    assert intervals == [2, 3, 3, 1, 1, 2]
+    assert scheduler.stats() == {
+        "interval": 2,
+        "ticks": 6,
+        "changed_ticks": 1,
+        "failed_ticks": 1,
+        "skipped_ticks": 0,
+        "last_lag": 0.0,
+    }
+
+
+def test_jitter_spreads_delays():
+    scheduler = SyncScheduler(Ticks(), min_interval=10, jitter=0.2, rng=random.Random(0))
+    delays = [scheduler.next_delay() for _ in range(100)]
+    assert all(8 <= delay <= 12 for delay in delays)
+    assert len(set(delays)) == 100
+
+    scheduler.jitter = 0
+    assert scheduler.next_delay() == 10
+
+
+async def test_lagging_event_loop_skips_ticks():
+    scheduler = SyncScheduler(Ticks(), min_interval=0, lag_threshold=0.05)
+
+    async def block_loop():
+        time.sleep(0.1)
+
+    blocker = asyncio.ensure_future(block_loop())
+    assert not await scheduler.sleep(0)
+    assert scheduler.last_lag >= 0.05
+    await blocker
+    assert await scheduler.sleep(0)
+
+
+async def test_run():
+    ticks = Ticks(*[False] * 5)
+    scheduler = SyncScheduler(ticks, min_interval=0.001, max_interval=0.002)
+    task = asyncio.ensure_future(scheduler.run())
+    while ticks.calls < 5:
+        await asyncio.sleep(0.001)
+    task.cancel()
+    assert scheduler.interval == 0.002
+
+
+async def test_ticks_are_not_skipped_for_longer_than_the_max_interval(monkeypatch):
+    skipped = []
+
+    async def tick():
+        skipped.append(scheduler.skipped_ticks)
+        return False
+
+    scheduler = SyncScheduler(tick, min_interval=0.01, jitter=0)
+
+    async def lagging_sleep(delay):
+        # The event loop never catches up.
+        await asyncio.sleep(delay + 0.005)
+        scheduler.last_lag = 1.0
+        return False
+
+    monkeypatch.setattr(scheduler, "sleep", lagging_sleep)
+    task = asyncio.ensure_future(scheduler.run())
+
+    async def wait_for_ticks():
+        while len(skipped) < 3:
+            await asyncio.sleep(0.001)
+
+    await asyncio.wait_for(wait_for_ticks(), 5)
+    task.cancel()
+    # One tick is skipped after each tick, then the next one runs anyway.
+    assert skipped[:3] == [0, 1, 2]